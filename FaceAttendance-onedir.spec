@@ -0,0 +1,54 @@
+# -*- mode: python ; coding: utf-8 -*-
+# Onedir build: a folder with FaceAttendance.exe next to its libraries. Nothing is
+# unpacked at launch (unlike the onefile FaceAttendance.spec), so it starts much faster.
+# Build with:  pyinstaller FaceAttendance-onedir.spec   ->  dist/FaceAttendance/
+from PyInstaller.utils.hooks import collect_all
+
+datas = [('Resources', 'Resources'), ('users.json', '.'), ('admins.json', '.'), ('attendance.csv', '.')]
+binaries = []
+hiddenimports = ['PIL._tkinter_finder']
+tmp_ret = collect_all('cv2')
+datas += tmp_ret[0]; binaries += tmp_ret[1]; hiddenimports += tmp_ret[2]
+
+
+a = Analysis(
+    ['app.py'],
+    pathex=[],
+    binaries=binaries,
+    datas=datas,
+    hiddenimports=hiddenimports,
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=['matplotlib', 'scipy', 'pandas', 'IPython', 'pytest'],
+    noarchive=False,
+    optimize=0,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [],
+    exclude_binaries=True,
+    name='FaceAttendance',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=False,
+    upx=False,  # Decompressing UPX-packed DLLs on every launch costs more than it saves on disk
+    console=False,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='FaceAttendance',
+)
@@ -1,110 +1,23 @@
-import cv2
+import time
+STARTED = time.perf_counter()  # Reference point for --startup-report
+
 import os
-import json
-import csv
-import numpy as np
-from PIL import Image as PILImage
 import sys
-from datetime import datetime, date
+import json
+import argparse
+import multiprocessing
+from jobs import BackgroundJob, Cancelled, format_eta
+from datetime import date
 from tkinter import *
-from tkinter import messagebox, simpledialog, ttk
-
-# ------------------------------
-# EXE SUPPORT: resource_path()
-# ------------------------------
-def resource_path(relative_path):
-    if hasattr(sys, "_MEIPASS"):
-        return os.path.join(sys._MEIPASS, relative_path)
-    return os.path.join(os.path.abspath("."), relative_path)
-
-
-# ------------------------------
-# Paths & Ensure Folders/Files
-# ------------------------------
-data_folder = resource_path("Data")
-resource_folder = resource_path("Resources")
-
-os.makedirs(data_folder, exist_ok=True)
-os.makedirs(resource_folder, exist_ok=True)
-
-users_json = resource_path("users.json")
-admins_json = resource_path("admins.json")
-attendance_csv = resource_path("attendance.csv")
-cascade_path = resource_path("Resources/haarcascade_frontalface_default.xml")
-model_path = resource_path("Resources/dataset_model.xml")
-
-# Create users.json if missing
-if not os.path.exists(users_json):
-    with open(users_json, "w") as f:
-        json.dump({}, f)
-
-# Create admins.json if missing
-if not os.path.exists(admins_json):
-    with open(admins_json, "w") as f:
-        json.dump({"admin": "1234"}, f)
-
-# Create attendance.csv if missing
-if not os.path.exists(attendance_csv):
-    with open(attendance_csv, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["User ID", "Name", "Time"])
-
-
-# ------------------------------
-# Load Cascade (graceful if missing)
-# ------------------------------
-if not os.path.exists(cascade_path):
-    try:
-        import cv2 as _cv2
-        cascade_path = os.path.join(os.path.dirname(_cv2.__file__), "data", "haarcascade_frontalface_default.xml")
-    except Exception:
-        cascade_path = None
-
-if cascade_path is None or not os.path.exists(cascade_path):
-    message = ("haarcascade_frontalface_default.xml not found.\n"
-               "Place it in Resources/ or install opencv and/or copy the cascade file.")
-    print(message)
-
-face_ref = cv2.CascadeClassifier(cascade_path) if cascade_path else None
-
-
-# ------------------------------
-# Helper: read users/admins/attendance
-# ------------------------------
-def load_users():
-    with open(users_json, "r") as f:
-        return json.load(f)
-
-def save_users(users_dict):
-    with open(users_json, "w") as f:
-        json.dump(users_dict, f, indent=2)
-
-def load_admins():
-    with open(admins_json, "r") as f:
-        return json.load(f)
-
-def read_attendance_rows():
-    rows = []
-    if os.path.exists(attendance_csv):
-        with open(attendance_csv, "r", newline="") as f:
-            reader = csv.reader(f)
-            next(reader, None)
-            for r in reader:
-                rows.append(r)
-    return rows
-
-def write_attendance_rows(rows):
-    with open(attendance_csv, "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["User ID", "Name", "Time"])
-        writer.writerows(rows)
-
-def append_attendance(user_id, name):
-    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    with open(attendance_csv, "a", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow([user_id, name, now])
-    return now
+from tkinter import messagebox, ttk, filedialog
+from common import (
+    data_folder, users_json, model_path, sample_cache_path, train_checkpoint_path, face_detector,
+    motion_gate, motion_min_check_hz,
+    load_users, save_users, load_admins,
+    attendance_page, append_attendance, delete_user_attendance, count_attendance, today_attendance,
+    attendance_db, late_after,
+)
+from attendance_db import REPORT_HEADERS, write_report_csv
 
 
 # ------------------------------
@@ -131,6 +44,10 @@ def update_bg_recursive(widget, color):
 # ------------------------------
 def delete_user(user_id, delete_attendance=False):
     """Delete user's face images, user record, and optionally attendance history"""
+    import lbph_model
+    import preprocess
+    import training
+
     users = load_users()
     
     if user_id not in users:
@@ -138,6 +55,7 @@ def delete_user(user_id, delete_attendance=False):
     
     user_name = users[user_id]
     deleted_files = 0
+    removed_names = []
     
     # Delete face images
     for filename in os.listdir(data_folder):
@@ -145,30 +63,62 @@ def delete_user(user_id, delete_attendance=False):
             try:
                 os.remove(os.path.join(data_folder, filename))
                 deleted_files += 1
+                removed_names.append(filename)
             except Exception as e:
                 print(f"Error deleting {filename}: {e}")
+    try:
+        preprocess.remove_originals(data_folder, user_id)
+    except OSError as e:
+        print(f"Error deleting backed-up samples: {e}")
+
+    # Drop cached face arrays for the removed files
+    cache = training.SampleCache(sample_cache_path)
+    cache.invalidate(removed_names)
+    cache.save()
     
     # Remove from users.json
     del users[user_id]
     save_users(users)
+
+    # Drop the user's histograms from the trained model (no full retrain needed)
+    removed_samples = 0
+    if user_id.isdigit():
+        try:
+            removed_samples = lbph_model.remove_user(model_path, int(user_id))
+            if os.path.exists(model_path):
+                lbph_model.compact(model_path)
+        except Exception as e:
+            print(f"Error updating model for {user_id}: {e}")
     
     # Optionally delete attendance records
     deleted_records = 0
     if delete_attendance:
-        rows = read_attendance_rows()
-        filtered_rows = [r for r in rows if len(r) >= 1 and r[0] != user_id]
-        deleted_records = len(rows) - len(filtered_rows)
-        write_attendance_rows(filtered_rows)
+        deleted_records = delete_user_attendance(user_id)
     
-    return True, f"Deleted user '{user_name}' (ID: {user_id})\n- {deleted_files} face images removed\n- {deleted_records} attendance records removed"
+    return True, f"Deleted user '{user_name}' (ID: {user_id})\n- {deleted_files} face images removed\n- {deleted_records} attendance records removed\n- {removed_samples} model samples removed"
+
+
+_session_metrics = None
+
+def session_metrics():
+    """Stage timings, overlay, dumps and profiling; off unless enabled via FACE_METRICS* / FACE_PROFILE"""
+    global _session_metrics
+    if _session_metrics is None:
+        import metrics
+        _session_metrics = metrics.from_env()
+    return _session_metrics
 
 
 # ------------------------------
 # REGISTER FACE
 # ------------------------------
+REGISTER_SAMPLES = 30       # Distinct samples kept per user
+REGISTER_MAX_FRAMES = 900   # Stop after ~30 s at 30 FPS even if fewer were accepted
+
 def register_face():
-    if face_ref is None or face_ref.empty():
-        messagebox.showerror("Error", "Face cascade not found. Put haarcascade_frontalface_default.xml in Resources/")
+    detector = face_detector()
+    if detector is None:
+        messagebox.showerror("Error", "Face detector not found. Put haarcascade_frontalface_default.xml in Resources/")
         return
 
     reg_win = Toplevel(app)
@@ -202,7 +152,7 @@ def register_face():
 
     info_frame = Frame(content, bg="#E3F2FD", relief=SOLID, bd=1)
     info_frame.pack(fill=X, pady=20)
-    Label(info_frame, text="ℹ️ The camera will capture 50 images of your face.\nPress 'Q' to stop early.", 
+    Label(info_frame, text=f"ℹ️ The camera will keep {REGISTER_SAMPLES} sharp, varied images of your face.\nSlowly turn your head. Press 'Q' to stop early.", 
           font=("Segoe UI", 9), bg="#E3F2FD", fg="#1976D2", justify=LEFT).pack(padx=10, pady=10)
 
     def start_capture():
@@ -217,199 +167,439 @@ def register_face():
             if not messagebox.askyesno("User Exists", f"User ID {user_id} already exists. Overwrite?"):
                 return
         
-        users[user_id] = user_name
-        save_users(users)
+        if "scan" in active_jobs:
+            messagebox.showerror("Camera Busy", "An attendance session is using the camera.\n\nPress 'Q' in its window to stop it first.")
+            return
+        if "train" in active_jobs:
+            # Training rewrites the whole model when it finishes, which would drop this user
+            messagebox.showerror("Training Running", "The model is being trained.\n\nRegister once training has finished.")
+            return
+        if "enroll" in active_jobs:
+            messagebox.showerror("Model Busy", "The model is still being updated.\n\nTry again in a moment.")
+            return
+
+        import cv2
+        import preprocess
+        import registration
+        import training
 
+        # Nothing is saved or removed until the camera is known to work
         cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
         if not cap.isOpened():
+            cap.release()
             messagebox.showerror("Camera Error", "Cannot open camera")
             return
 
-        count = 0
-        messagebox.showinfo("Ready", "Camera will start. Position your face in the frame.\nPress 'Q' to stop.")
+        users[user_id] = user_name
+        save_users(users)
+        # Backups of a previous registration would otherwise be restored by a forced migration
+        preprocess.remove_originals(data_folder, user_id)
+        normalize = preprocess.default_normalizer()
+
+        selector = registration.SampleSelector(target=REGISTER_SAMPLES)
+        writer = registration.ImageWriter()
+        frames = 0
+        messagebox.showinfo("Ready", "Camera will start. Position your face in the frame and slowly turn your head.\nPress 'Q' to stop.")
         
+        m = session_metrics()
         while True:
-            ret, frame = cap.read()
+            with m.time("register_capture"):
+                ret, frame = cap.read()
             if not ret:
                 break
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            faces = face_ref.detectMultiScale(gray, 1.3, 5)
+            frames += 1
+            with m.time("register_convert"):
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            with m.time("register_detect"):
+                face = registration.largest_face(detector.detect(gray))
             
-            for (x, y, w, h) in faces:
-                count += 1
-                path = os.path.join(data_folder, f"User.{user_id}.{count}.jpg")
-                cv2.imwrite(path, gray[y:y+h, x:x+w])
-                cv2.rectangle(frame, (x,y),(x+w,y+h),(0,255,0),2)
-                cv2.putText(frame, f"Captured: {count}/50", (10, 30), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
+            if face is not None:
+                x, y, w, h = face
+                crop = gray[y:y+h, x:x+w]
+                with m.time("register_score"):
+                    status, slot = selector.offer(crop)
+                if slot is not None:
+                    # Saved canonical and recorded below, so training reads it as is; a new array, safe for the writer thread
+                    path = os.path.join(data_folder, f"User.{user_id}.{slot + 1}.jpg")
+                    with m.time("register_queue"):
+                        writer.write(path, normalize(crop))
+                color = (0,255,0) if slot is not None else (0,165,255)
+                cv2.rectangle(frame, (x,y),(x+w,y+h), color, 2)
+                if slot is None and status != "full":
+                    cv2.putText(frame, "Hold still" if status == "blurry" else "Turn your head slightly", 
+                               (x, y-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+            cv2.putText(frame, f"Captured: {len(selector.scores)}/{REGISTER_SAMPLES}", (10, 30), 
+                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0,255,0), 2)
             
             cv2.putText(frame, "Press 'Q' to stop", (10, frame.shape[0]-20), 
                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
-            cv2.imshow("Register Face", frame)
+            m.tick("register_frames")
+            m.draw_overlay(frame, "register_frames")
+            with m.time("register_display"):
+                cv2.imshow("Register Face", frame)
+                key = cv2.waitKey(1) & 0xFF
+            m.maybe_dump()
             
-            if cv2.waitKey(1) & 0xFF == ord("q") or count >= 50:
+            if key == ord("q") or selector.full() or frames >= REGISTER_MAX_FRAMES:
                 break
         
+        m.close()
         cap.release()
         cv2.destroyAllWindows()
-        messagebox.showinfo("Success", f"✓ Registration complete!\n\n{count} images captured for {user_name}\n\nReminder: Admin must train the model before attendance works.")
+        writer.close()
+        for error in writer.errors:
+            print(f"Error saving sample {error}")
+        count = len(selector.scores)
+
+        # Samples beyond this capture are left over from an earlier registration
+        stale = [f for f in user_image_files(user_id) if (training.sample_index(f) or 0) > count]
+        for filename in stale:
+            os.remove(os.path.join(data_folder, filename))
+        if stale:
+            cache = training.SampleCache(sample_cache_path)
+            cache.invalidate(stale)
+            cache.save()
+        # Training uses recorded samples as they are instead of normalizing them again
+        try:
+            preprocess.mark_normalized(data_folder, [os.path.basename(p) for p in writer.paths])
+        except OSError as e:
+            print(f"Error recording normalized samples: {e}")
+
         reg_win.destroy()
 
+        def on_enrolled(added):
+            if added:
+                messagebox.showinfo("Success", f"✓ Registration complete!\n\n{count} images captured for {user_name}\n\nModel updated with {added} face samples. Ready for attendance.")
+            else:
+                messagebox.showinfo("Success", f"✓ Registration complete!\n\n{count} images captured for {user_name}\n\nReminder: Admin must train the model before attendance works.")
+
+        def on_enroll_error(error):
+            messagebox.showerror("Error", f"{count} images were captured for {user_name}, but the model could not be updated:\n{error}\n\nTrain the model to include them.")
+
+        # Merge into an existing model in the background instead of waiting for a full retrain
+        if count:
+            start_job("enroll", lambda ctx: enroll_user_incremental(user_id),
+                      on_done=on_enrolled, on_error=on_enroll_error)
+        else:
+            on_enrolled(None)
+
     Button(content, text="Start Camera Capture", command=start_capture, 
            font=("Segoe UI", 12, "bold"), bg="#4CAF50", fg="white", 
            relief=FLAT, cursor="hand2", height=2).pack(fill=X, pady=(10,0))
 
 
+# ------------------------------
+# TRAINING SAMPLES
+# ------------------------------
+def user_image_files(user_id):
+    return [f for f in os.listdir(data_folder)
+            if f.startswith(f"User.{user_id}.") and f.lower().endswith((".jpg", ".jpeg"))]
+
+def load_face_samples(image_files, progress=None, prune=False):
+    """Load face crops and integer labels from User.<id>.<n>.jpg files in Data/"""
+    import training
+
+    cache = training.SampleCache(sample_cache_path)
+    if prune:
+        cache.prune(image_files)
+    return training.collect_samples(data_folder, image_files, cache, progress)
+
+def enroll_user_incremental(user_id):
+    """Merge one user's samples into the existing model; returns samples added or None"""
+    import lbph_model
+    import training
+
+    if not os.path.exists(model_path):
+        return None
+    try:
+        label = int(user_id)
+    except ValueError:
+        return None
+    faces, ids = load_face_samples(user_image_files(user_id))
+    if not faces:
+        lbph_model.remove_user(model_path, label)
+        return 0
+    histograms = training.compute_histograms(faces)
+    keep = training.select_representatives(histograms, ids)
+    faces = [faces[i] for i in keep]
+    added = lbph_model.add_user(model_path, faces, label, histograms[keep])
+    # Enrollment only appends to the model's journal; the model file is rewritten once that grows
+    lbph_model.compact(model_path)
+    return added
+
+
+# ------------------------------
+# BACKGROUND JOBS
+# ------------------------------
+active_jobs = {}  # "train" / "scan" / "enroll" -> BackgroundJob, so a second click cannot start a duplicate
+
+def start_job(name, target, **callbacks):
+    """Run target(ctx) off the Tk thread; the job is forgotten once it finishes"""
+    def finished(callback):
+        def handler(*args):
+            active_jobs.pop(name, None)
+            if callback:
+                callback(*args)
+        return handler
+
+    for kind in ("on_done", "on_error", "on_cancel"):
+        callbacks[kind] = finished(callbacks.get(kind))
+    job = BackgroundJob(app, target, name=name, **callbacks)
+    active_jobs[name] = job
+    return job.start()
+
+def cancel_jobs_and_quit():
+    for job in list(active_jobs.values()):
+        job.cancel()
+    for job in list(active_jobs.values()):
+        job.thread.join(timeout=5)  # Lets training write its checkpoint and the camera close
+    app.destroy()
+
+
 # ------------------------------
 # TRAIN MODEL
 # ------------------------------
 def train_model():
-    if face_ref is None or face_ref.empty():
-        messagebox.showerror("Error", "Face cascade not found.")
+    detector = face_detector()
+    if detector is None:
+        messagebox.showerror("Error", "Face detector not found.")
+        return
+    if "train" in active_jobs:
+        messagebox.showinfo("Training", "Training is already running.")
+        return
+    if "enroll" in active_jobs:
+        messagebox.showinfo("Training", "The model is still being updated with a registration or deletion.\n\nTry again in a moment.")
         return
 
-    # Progress window
+    # Progress window; not modal, so the rest of the app stays usable while training
     progress_win = Toplevel(app)
     progress_win.title("Training Model")
-    progress_win.geometry("400x200")
+    progress_win.geometry("400x240")
     progress_win.configure(bg="#f0f0f0")
     progress_win.transient(app)
-    progress_win.grab_set()
     
     x = (progress_win.winfo_screenwidth() // 2) - 200
-    y = (progress_win.winfo_screenheight() // 2) - 100
-    progress_win.geometry(f"400x200+{x}+{y}")
+    y = (progress_win.winfo_screenheight() // 2) - 120
+    progress_win.geometry(f"400x240+{x}+{y}")
     
     Label(progress_win, text="Training Model...", font=("Segoe UI", 14, "bold"), 
-          bg="#f0f0f0").pack(pady=30)
+          bg="#f0f0f0").pack(pady=(25,10))
     progress_label = Label(progress_win, text="Processing images...", 
                           font=("Segoe UI", 10), bg="#f0f0f0")
     progress_label.pack()
-    
-    progress_win.update()
+    progress_bar = ttk.Progressbar(progress_win, length=320, maximum=100)
+    progress_bar.pack(pady=10)
+    eta_label = Label(progress_win, text="", font=("Segoe UI", 9), fg="#666", bg="#f0f0f0")
+    eta_label.pack()
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
     image_files = [f for f in os.listdir(data_folder) if f.lower().endswith((".jpg", ".jpeg"))]
-    faces, ids = [], []
-    
-    for idx, filename in enumerate(image_files):
-        try:
-            img_pil = PILImage.open(os.path.join(data_folder, filename)).convert("L")
-        except Exception as e:
-            print(f"Could not open {filename}: {e}")
-            continue
-        
-        img_np = np.array(img_pil, "uint8")
+
+    def run(ctx):
+        import lbph_model
+        import training
+
+        cache = training.SampleCache(sample_cache_path)
+        cache.prune(image_files)
+        # Histograms from an earlier, cancelled run are reused instead of recomputed
+        checkpoint = training.HistogramCheckpoint(train_checkpoint_path)
         try:
-            user_id = int(filename.split(".")[1])
-        except:
-            continue
-        
-        det = face_ref.detectMultiScale(img_np)
-        for (x,y,w,h) in det:
-            faces.append(img_np[y:y+h, x:x+w])
-            ids.append(user_id)
-        
-        if idx % 10 == 0:
-            progress_label.config(text=f"Processing: {idx+1}/{len(image_files)} images")
-            progress_win.update()
+            sample_count, kept = training.train_files(data_folder, image_files, model_path, cache,
+                                                      progress=ctx.progress, checkpoint=checkpoint,
+                                                      cancelled=lambda: ctx.cancelled)
+        except training.TrainingCancelled:
+            raise Cancelled()
+        if sample_count:
+            # Binary twin of the XML model; attendance sessions memory-map it instead of parsing XML.
+            # The model itself is already saved, and sessions regenerate a missing twin
+            try:
+                lbph_model.export_binary(model_path)
+            except Exception as e:
+                print(f"Could not write binary model: {e}")
+        return sample_count, kept
 
-    if len(faces) == 0:
+    def on_progress(done, total, message, eta):
+        if done >= total:
+            progress_label.config(text="Selecting representative samples...")
+            eta_label.config(text="")
+        else:
+            progress_label.config(text=f"Processing: {done}/{total} images")
+            eta_label.config(text=format_eta(eta))
+        progress_bar["value"] = 100 * done / total if total else 0
+
+    def on_done(result):
+        sample_count, kept = result
         progress_win.destroy()
-        messagebox.showerror("Error", "No training data found. Please register users first.")
-        return
+        if sample_count == 0:
+            messagebox.showerror("Error", "No training data found. Please register users first.")
+            return
+        messagebox.showinfo("Success", f"✓ Model trained successfully!\n\n{sample_count} face samples processed\n{kept} representative samples kept in the model\nSystem ready for attendance.")
 
-    progress_label.config(text="Training neural network...")
-    progress_win.update()
-    
-    recognizer.train(faces, np.array(ids))
-    recognizer.save(model_path)
-    
-    progress_win.destroy()
-    messagebox.showinfo("Success", f"✓ Model trained successfully!\n\n{len(faces)} face samples processed\nSystem ready for attendance.")
+    def on_cancel():
+        progress_win.destroy()
+        messagebox.showinfo("Training Cancelled", "Training was cancelled.\n\nProgress was saved; the next training run continues from where this one stopped.")
+
+    def on_error(error):
+        progress_win.destroy()
+        messagebox.showerror("Error", f"Training failed:\n{error}")
+
+    def cancel():
+        cancel_btn.config(state=DISABLED, text="Cancelling...")
+        job.cancel()
+
+    cancel_btn = Button(progress_win, text="Cancel", font=("Segoe UI", 10), command=cancel)
+    cancel_btn.pack(pady=10)
+    progress_win.protocol("WM_DELETE_WINDOW", cancel)
+
+    job = start_job("train", run, on_progress=on_progress, on_done=on_done,
+                    on_cancel=on_cancel, on_error=on_error)
 
 
 # ------------------------------
 # ATTENDANCE SYSTEM
 # ------------------------------
 def attendance_system():
-    if face_ref is None or face_ref.empty():
-        messagebox.showerror("Error", "Face cascade not found.")
+    detector = face_detector()
+    if detector is None:
+        messagebox.showerror("Error", "Face detector not found.")
         return
 
     if not os.path.exists(model_path):
         messagebox.showerror("Error", "Model not trained yet.\n\nPlease ask admin to train the model first.")
         return
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read(model_path)
-    users = load_users()
+    if "scan" in active_jobs:
+        messagebox.showinfo("Attendance Mode", "An attendance session is already running.\n\nPress 'Q' in its window to stop it.")
+        return
 
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
-    if not cap.isOpened():
+    import cv2
+    from matcher import get_model_holder
+    from engine import RecognitionEngine, CameraSource, FaceTracker, LatestSlot, default_detector, motion_gated
+
+    m = session_metrics()
+    source = CameraSource(0)
+    if not source.is_opened():
         messagebox.showerror("Camera Error", "Cannot open camera")
         return
 
     messagebox.showinfo("Attendance Mode", "✓ Camera ready!\n\n• Position your face clearly\n• System will auto-detect and record\n• Press 'Q' to exit")
 
-    recognized_users = set()  # Track who's been recognized this session
+    today_attendance.invalidate()  # Pick up rows written since the last session
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            break
-        
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        detected = face_ref.detectMultiScale(gray, 1.3, 5)
-        
-        # Add instructions overlay
-        cv2.putText(frame, "ATTENDANCE SYSTEM", (10, 30), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
-        cv2.putText(frame, "Press 'Q' to exit", (10, frame.shape[0]-20), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
-        
-        for (x,y,w,h) in detected:
-            user_id, conf = recognizer.predict(gray[y:y+h, x:x+w])
-            name = users.get(str(user_id), "Unknown")
-
-            # Check if already attended today
-            rows = read_attendance_rows()
-            today_str = date.today().isoformat()
-            already_today = False
-            
-            for r in rows:
-                if len(r) >= 3:
-                    if r[0] == str(user_id) and r[2].startswith(today_str):
-                        already_today = True
-                        break
-
-            if name == "Unknown":
-                cv2.rectangle(frame, (x,y),(x+w,y+h),(0,0,255),2)
-                cv2.putText(frame, "Unknown", (x, y-10), 
-                           cv2.FONT_HERSHEY_DUPLEX, 0.8, (0,0,255), 2)
-            elif already_today:
-                cv2.rectangle(frame, (x,y),(x+w,y+h),(255,165,0),2)
-                cv2.putText(frame, f"{name} - Already recorded", (x, y-10), 
-                           cv2.FONT_HERSHEY_DUPLEX, 0.7, (255,165,0), 2)
-            else:
-                # Record attendance only once per session
-                if user_id not in recognized_users:
-                    append_attendance(user_id, name)
-                    recognized_users.add(user_id)
-                
-                cv2.rectangle(frame, (x,y),(x+w,y+h),(0,255,0),3)
-                cv2.putText(frame, f"{name} - Recorded!", (x, y-10), 
-                           cv2.FONT_HERSHEY_DUPLEX, 0.8, (0,255,0), 2)
+    # The worker captures, recognizes and draws; the Tk thread only shows its newest frame,
+    # since HighGUI and Tk windows must be driven from the main thread
+    shown = LatestSlot()
+    view = Toplevel(app)
+    view.title("Attendance System")
+    view.configure(bg="black")
+    screen = Label(view, bg="black")
+    screen.pack()
 
-        cv2.imshow("Attendance System", frame)
-        if cv2.waitKey(1) & 0xFF == ord("q"):
-            break
-
-    cap.release()
-    cv2.destroyAllWindows()
-    
-    if recognized_users:
-        messagebox.showinfo("Session Complete", f"✓ Attendance recorded for {len(recognized_users)} user(s)")
+    def run(ctx):
+        recognized_users = set()  # Track who's been recognized this session
+        try:
+            # Process-wide warm model (vectorized matcher + users); a retrained model is swapped
+            # in mid-session without restarting the scan. The first load (seconds right after a
+            # retrain) happens here rather than on the Tk thread.
+            model = get_model_holder(model_path, load_users, users_json)
+            # Tracks faces across frames so each person is predicted a few times, not every frame
+            # Detection runs on a downscaled frame around known faces, with periodic full scans,
+            # and only when something moves (plus a few checks a second) so an empty hallway costs little
+            engine = RecognitionEngine(None, model=model, tracker=FaceTracker(),
+                                       detector=motion_gated(detector, motion_min_check_hz, m) if motion_gate
+                                       else default_detector(detector), metrics=m)
+        except BaseException:
+            shown.close()
+            source.close()
+            raise
+        # Capture and recognition run on their own threads (recognition is the profiled one)
+        pipeline = engine.run_threaded(source)
+        try:
+            for frame, events in pipeline:
+                draw_started = time.perf_counter()
+                # Add instructions overlay
+                cv2.putText(frame, "ATTENDANCE SYSTEM", (10, 30), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,255), 2)
+                cv2.putText(frame, "Press 'Q' to exit", (10, frame.shape[0]-20), 
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 2)
+                
+                for event in events:
+                    user_id, name = event.user_id, event.name
+                    x, y, w, h = event.bbox
+
+                    # Check if already attended today (in-memory, no CSV re-read per frame)
+                    with m.time("dedupe"):
+                        already_today = today_attendance.contains(user_id)
+
+                    if not event.confirmed:
+                        cv2.rectangle(frame, (x,y),(x+w,y+h),(0,255,255),2)
+                        cv2.putText(frame, "Identifying...", (x, y-10), 
+                                   cv2.FONT_HERSHEY_DUPLEX, 0.7, (0,255,255), 2)
+                    elif name == "Unknown":
+                        cv2.rectangle(frame, (x,y),(x+w,y+h),(0,0,255),2)
+                        cv2.putText(frame, "Unknown", (x, y-10), 
+                                   cv2.FONT_HERSHEY_DUPLEX, 0.8, (0,0,255), 2)
+                    elif already_today:
+                        cv2.rectangle(frame, (x,y),(x+w,y+h),(255,165,0),2)
+                        cv2.putText(frame, f"{name} - Already recorded", (x, y-10), 
+                                   cv2.FONT_HERSHEY_DUPLEX, 0.7, (255,165,0), 2)
+                    else:
+                        # Record attendance only once per session
+                        if user_id not in recognized_users:
+                            with m.time("record"):
+                                append_attendance(user_id, name)
+                            recognized_users.add(user_id)
+                        
+                        cv2.rectangle(frame, (x,y),(x+w,y+h),(0,255,0),3)
+                        cv2.putText(frame, f"{name} - Recorded!", (x, y-10), 
+                                   cv2.FONT_HERSHEY_DUPLEX, 0.8, (0,255,0), 2)
+
+                m.draw_overlay(frame)
+                m.observe("draw", time.perf_counter() - draw_started)
+                shown.put(frame)
+                m.maybe_dump()
+                if ctx.cancelled:
+                    break
+        finally:
+            shown.close()
+            pipeline.stop()
+            m.close()
+        return len(recognized_users)
+
+    def show_frame():
+        if not view.winfo_exists():
+            return
+        frame = shown.get(timeout=0)
+        if frame is not None:
+            from PIL import Image, ImageTk
+            with m.time("display"):
+                photo = ImageTk.PhotoImage(Image.fromarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+                screen.config(image=photo)
+                screen.image = photo  # Tk does not keep its own reference
+            m.tick("frames")
+        view.after(10, show_frame)
+
+    def stop(event=None):
+        job.cancel()
+
+    def close_view():
+        if view.winfo_exists():
+            view.destroy()
+
+    def on_done(recorded):
+        close_view()
+        if recorded:
+            messagebox.showinfo("Session Complete", f"✓ Attendance recorded for {recorded} user(s)")
+
+    def on_error(error):
+        close_view()
+        messagebox.showerror("Attendance Error", f"The attendance session stopped:\n{error}")
+
+    view.bind("<KeyPress-q>", stop)
+    view.bind("<KeyPress-Q>", stop)
+    view.protocol("WM_DELETE_WINDOW", stop)
+    view.focus_force()
+    job = start_job("scan", run, on_done=on_done, on_error=on_error)
+    show_frame()
 
 
 # ------------------------------
@@ -477,6 +667,13 @@ def open_delete_user_window():
             messagebox.showwarning("No Selection", "Please select a user to delete")
             return
 
+        if "train" in active_jobs:
+            messagebox.showerror("Training Running", "The model is being trained.\n\nDelete users once training has finished.")
+            return
+        if "enroll" in active_jobs:
+            messagebox.showerror("Model Busy", "The model is still being updated.\n\nTry again in a moment.")
+            return
+
         selected_uid = user_items[selection[0]]
         selected_name = users[selected_uid]
 
@@ -488,15 +685,26 @@ def open_delete_user_window():
             "\nThis action cannot be undone!"
         )
 
-        if confirm:
-            success, message = delete_user(selected_uid, delete_attendance_var.get())
+        if not confirm:
+            return
+
+        def on_deleted(result):
+            success, message = result
             if success:
                 messagebox.showinfo("Success", "✓ " + message)
-                del_win.destroy()
-                messagebox.showinfo("Reminder", "⚠️ Please retrain the model after deleting users!")
+                if del_win.winfo_exists():
+                    del_win.destroy()
             else:
                 messagebox.showerror("Error", message)
 
+        def on_delete_error(error):
+            messagebox.showerror("Error", f"Could not delete the user:\n{error}")
+
+        # Files, records and the model are updated off the Tk thread
+        delete_attendance = delete_attendance_var.get()
+        start_job("enroll", lambda ctx: delete_user(selected_uid, delete_attendance),
+                  on_done=on_deleted, on_error=on_delete_error)
+
     # Buttons
     btn_frame = Frame(content, bg="#f0f0f0")
     btn_frame.pack(fill=X)
@@ -599,7 +807,11 @@ def open_admin_panel():
            font=("Segoe UI", 11, "bold"), bg="#f44336", fg="white", 
            relief=FLAT, cursor="hand2", height=2, width=15).pack(side=LEFT, padx=(0,10))
     
-    Button(btn_frame, text="🔃 Refresh", command=lambda: populate_treeview(tree), 
+    Button(btn_frame, text="📈 Reports", command=open_reports_window, 
+           font=("Segoe UI", 11, "bold"), bg="#FF9800", fg="white", 
+           relief=FLAT, cursor="hand2", height=2, width=12).pack(side=LEFT, padx=(0,10))
+    
+    Button(btn_frame, text="🔃 Refresh", command=lambda: grid.refresh(), 
            font=("Segoe UI", 11), bg="#2196F3", fg="white", 
            relief=FLAT, cursor="hand2", height=2, width=12).pack(side=LEFT)
 
@@ -618,12 +830,12 @@ def open_admin_panel():
     date_entry.insert(0, date.today().isoformat())
     
     Button(filter_inner, text="Apply Filter", 
-           command=lambda: populate_treeview(tree, date_entry.get().strip()),
+           command=lambda: grid.set_filter(date_entry.get().strip()),
            font=("Segoe UI", 9), bg="#3F51B5", fg="white", 
            relief=FLAT, cursor="hand2").pack(side=LEFT, padx=(0,10))
     
     Button(filter_inner, text="Clear Filter", 
-           command=lambda: [date_entry.delete(0, END), populate_treeview(tree)],
+           command=lambda: [date_entry.delete(0, END), grid.set_filter()],
            font=("Segoe UI", 9), bg="#757575", fg="white", 
            relief=FLAT, cursor="hand2").pack(side=LEFT)
 
@@ -663,183 +875,392 @@ def open_admin_panel():
     style.configure("Treeview", font=("Segoe UI", 10), rowheight=28)
     style.configure("Treeview.Heading", font=("Segoe UI", 10, "bold"))
 
-    populate_treeview(tree)
+    # Page navigation
+    nav_frame = Frame(content, bg="#f0f0f0")
+    nav_frame.pack(fill=X, pady=(8,0))
+    page_label = Label(nav_frame, text="", font=("Segoe UI", 9), bg="#f0f0f0", fg="#424242")
+
+    grid = AttendanceGrid(tree, page_label)
+
+    Button(nav_frame, text="⏮", command=lambda: grid.go_to(0),
+           font=("Segoe UI", 9), relief=FLAT, cursor="hand2").pack(side=LEFT)
+    Button(nav_frame, text="◀ Prev", command=lambda: grid.go_to(grid.page - 1),
+           font=("Segoe UI", 9), relief=FLAT, cursor="hand2").pack(side=LEFT, padx=(5,0))
+    page_label.pack(side=LEFT, padx=10)
+    Button(nav_frame, text="Next ▶", command=lambda: grid.go_to(grid.page + 1),
+           font=("Segoe UI", 9), relief=FLAT, cursor="hand2").pack(side=LEFT)
+    Button(nav_frame, text="⏭", command=lambda: grid.go_to(grid.page_count() - 1),
+           font=("Segoe UI", 9), relief=FLAT, cursor="hand2").pack(side=LEFT, padx=(5,0))
+
+    grid.refresh()
     
     # Status bar
     status_frame = Frame(content, bg="#E0E0E0", height=30)
     status_frame.pack(fill=X, pady=(10,0))
     
     users = load_users()
-    rows = read_attendance_rows()
-    status_text = f"👥 Total Users: {len(users)}  |  📋 Total Records: {len(rows)}  |  📅 Today: {len([r for r in rows if len(r)>=3 and r[2].startswith(date.today().isoformat())])}"
+    status_text = f"👥 Total Users: {len(users)}  |  📋 Total Records: {count_attendance()}  |  📅 Today: {count_attendance(date.today().isoformat())}"
     Label(status_frame, text=status_text, font=("Segoe UI", 9), 
           bg="#E0E0E0", fg="#424242").pack(pady=5)
 
 
-def populate_treeview(tree, date_filter=""):
-    # Clear existing
-    for r in tree.get_children():
-        tree.delete(r)
-    
-    rows = read_attendance_rows()
-    count = 0
-    
-    for r in rows:
-        if len(r) < 3:
-            continue
-        if date_filter and not r[2].startswith(date_filter):
-            continue
-        
-        # Alternate row colors
-        tag = 'evenrow' if count % 2 == 0 else 'oddrow'
-        tree.insert("", "end", values=(r[0], r[1], r[2]), tags=(tag,))
-        count += 1
-    
-    tree.tag_configure('evenrow', background='#f9f9f9')
-    tree.tag_configure('oddrow', background='#ffffff')
-    
-    if count == 0 and date_filter:
-        tree.insert("", "end", values=("", "No records found for this date", ""))
+def open_reports_window():
+    rep_win = Toplevel(app)
+    rep_win.title("Attendance Reports")
+    rep_win.geometry("700x600")
+    rep_win.configure(bg="#f0f0f0")
 
+    x = (rep_win.winfo_screenwidth() // 2) - 350
+    y = (rep_win.winfo_screenheight() // 2) - 300
+    rep_win.geometry(f"700x600+{x}+{y}")
 
-# ------------------------------
-# MAIN GUI
-# ------------------------------
-app = Tk()
-app.title("Face Recognition Attendance System")
-app.geometry("600x700")
-app.configure(bg="#f5f5f5")
-
-# Center window
-app.update_idletasks()
-x = (app.winfo_screenwidth() // 2) - (600 // 2)
-y = (app.winfo_screenheight() // 2) - (700 // 2)
-app.geometry(f"600x700+{x}+{y}")
-
-# Header Section
-header = Frame(app, bg="#1976D2", height=120)
-header.pack(fill=X)
-header.pack_propagate(False)
-
-Label(header, text="👤 Face Recognition", font=("Segoe UI", 24, "bold"), 
-      bg="#1976D2", fg="white").pack(pady=(20,5))
-Label(header, text="Attendance Management System", font=("Segoe UI", 14), 
-      bg="#1976D2", fg="#E3F2FD").pack()
-
-# Main content
-content = Frame(app, bg="#f5f5f5")
-content.pack(fill=BOTH, expand=True, padx=30, pady=30)
-
-# Welcome message
-welcome_frame = Frame(content, bg="#E3F2FD", relief=SOLID, bd=1)
-welcome_frame.pack(fill=X, pady=(0,25))
-Label(welcome_frame, text="Welcome! Choose an option below to get started", 
-      font=("Segoe UI", 11), bg="#E3F2FD", fg="#1565C0").pack(pady=15)
-
-# User section
-Label(content, text="👥 User Functions", font=("Segoe UI", 13, "bold"), 
-      bg="#f5f5f5", fg="#424242").pack(anchor=W, pady=(0,12))
-
-user_frame = Frame(content, bg="#f5f5f5")
-user_frame.pack(fill=X, pady=(0,20))
+    # Header
+    header = Frame(rep_win, bg="#FF9800", height=70)
+    header.pack(fill=X)
+    Label(header, text="📈 Attendance Reports", font=("Segoe UI", 18, "bold"), 
+          bg="#FF9800", fg="white").pack(pady=20)
 
-# ------------------------------
-# REGISTER BUTTON (Clickable everywhere)
-# ------------------------------
-register_btn = Frame(user_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
-register_btn.pack(fill=X, pady=(0,12))
+    content = Frame(rep_win, bg="#f0f0f0")
+    content.pack(fill=BOTH, expand=True, padx=20, pady=20)
 
-def on_enter_register(e):
-    update_bg_recursive(register_btn, "#E8F5E9")
+    # Date range
+    range_frame = Frame(content, bg="#FFF3E0", relief=SOLID, bd=1)
+    range_frame.pack(fill=X, pady=(0,15))
+    range_inner = Frame(range_frame, bg="#FFF3E0")
+    range_inner.pack(padx=15, pady=12)
 
-def on_leave_register(e):
-    update_bg_recursive(register_btn, "white")
+    today = date.today()
+    Label(range_inner, text="From:", font=("Segoe UI", 10, "bold"), bg="#FFF3E0").pack(side=LEFT, padx=(0,5))
+    start_entry = Entry(range_inner, font=("Segoe UI", 10), width=12, relief=SOLID, bd=1)
+    start_entry.pack(side=LEFT, padx=(0,10), ipady=4)
+    start_entry.insert(0, today.replace(day=1).isoformat())
 
-register_btn.bind("<Enter>", on_enter_register)
-register_btn.bind("<Leave>", on_leave_register)
-bind_click_recursive(register_btn, lambda e: register_face())
+    Label(range_inner, text="To:", font=("Segoe UI", 10, "bold"), bg="#FFF3E0").pack(side=LEFT, padx=(0,5))
+    end_entry = Entry(range_inner, font=("Segoe UI", 10), width=12, relief=SOLID, bd=1)
+    end_entry.pack(side=LEFT, padx=(0,10), ipady=4)
+    end_entry.insert(0, today.isoformat())
 
-register_icon = Label(register_btn, text="📸", font=("Segoe UI", 24), bg="white", cursor="hand2")
-register_icon.pack(side=LEFT, padx=(20,15), pady=20)
+    Label(content, text=f"Late = first check-in of the day after {late_after}", font=("Segoe UI", 9), 
+          bg="#f0f0f0", fg="#666").pack(anchor=W, pady=(0,10))
 
-info_frame = Frame(register_btn, bg="white", cursor="hand2")
-info_frame.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+    tree_frame = Frame(content, relief=SOLID, bd=1)
+    tree_frame.pack(fill=BOTH, expand=True)
+    vsb = Scrollbar(tree_frame, orient="vertical")
+    tree = ttk.Treeview(tree_frame, show="headings", yscrollcommand=vsb.set)
+    vsb.config(command=tree.yview)
+    vsb.pack(side=RIGHT, fill=Y)
+    tree.pack(fill=BOTH, expand=True)
 
-Label(info_frame, text="Register New User", font=("Segoe UI", 13, "bold"), 
-      bg="white", fg="#2E7D32", cursor="hand2").pack(anchor=W)
-Label(info_frame, text="Capture face images for a new user", 
-      font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
+    current = {"kind": None, "rows": []}
 
-# ------------------------------
-# ATTENDANCE BUTTON (Clickable everywhere)
-# ------------------------------
-attend_btn = Frame(user_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
-attend_btn.pack(fill=X)
+    def show(kind):
+        start, end = start_entry.get().strip(), end_entry.get().strip()
+        try:
+            if date.fromisoformat(start) > date.fromisoformat(end):
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Enter a valid range as YYYY-MM-DD", parent=rep_win)
+            return
+        db = attendance_db()
+        rows = db.range_summary(start, end) if kind == "summary" else db.daily_totals(start, end)
+
+        header_row = REPORT_HEADERS[kind]
+        columns = [f"c{i}" for i in range(len(header_row))]
+        tree.delete(*tree.get_children())
+        tree.config(columns=columns)
+        for col, text in zip(columns, header_row):
+            tree.heading(col, text=text)
+            tree.column(col, width=120, anchor=CENTER)
+        for r in rows:
+            tree.insert("", "end", values=r)
+        current.update(kind=kind, rows=rows, range=(start, end))
+
+    def export():
+        if not current["kind"]:
+            messagebox.showwarning("No Report", "Run a report first", parent=rep_win)
+            return
+        start, end = current["range"]
+        path = filedialog.asksaveasfilename(parent=rep_win, defaultextension=".csv",
+                                            initialfile=f"attendance_{current['kind']}_{start}_{end}.csv",
+                                            filetypes=[("CSV files", "*.csv")])
+        if path:
+            write_report_csv(path, REPORT_HEADERS[current["kind"]], current["rows"])
+            messagebox.showinfo("Exported", f"Saved {len(current['rows'])} rows to\n{path}", parent=rep_win)
+
+    btn_frame = Frame(content, bg="#f0f0f0")
+    btn_frame.pack(fill=X, pady=(15,0))
+    Button(btn_frame, text="👥 Per-user Summary", command=lambda: show("summary"), 
+           font=("Segoe UI", 10, "bold"), bg="#3F51B5", fg="white", 
+           relief=FLAT, cursor="hand2").pack(side=LEFT, padx=(0,10))
+    Button(btn_frame, text="📅 Daily Totals", command=lambda: show("daily"), 
+           font=("Segoe UI", 10, "bold"), bg="#3F51B5", fg="white", 
+           relief=FLAT, cursor="hand2").pack(side=LEFT, padx=(0,10))
+    Button(btn_frame, text="💾 Export CSV", command=export, 
+           font=("Segoe UI", 10), bg="#4CAF50", fg="white", 
+           relief=FLAT, cursor="hand2").pack(side=LEFT)
 
-def on_enter_attend(e):
-    update_bg_recursive(attend_btn, "#E3F2FD")
+    show("summary")
 
-def on_leave_attend(e):
-    update_bg_recursive(attend_btn, "white")
 
-attend_btn.bind("<Enter>", on_enter_attend)
-attend_btn.bind("<Leave>", on_leave_attend)
-bind_click_recursive(attend_btn, lambda e: attendance_system())
+class AttendanceGrid:
+    """Attendance Treeview that holds one page of rows at a time.
 
-attend_icon = Label(attend_btn, text="✓", font=("Segoe UI", 28), bg="white", cursor="hand2")
-attend_icon.pack(side=LEFT, padx=(20,15), pady=20)
+    Filtering, sorting and paging are done by the attendance database, so the cost of
+    a refresh depends on the page size rather than on the size of the history.
+    """
+    PAGE_SIZE = 100
 
-info_frame2 = Frame(attend_btn, bg="white", cursor="hand2")
-info_frame2.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+    def __init__(self, tree, page_label):
+        self.tree = tree
+        self.page_label = page_label
+        self.date_filter = ""
+        self.sort = None
+        self.descending = False
+        self.page = 0
+        self.total = 0
 
-Label(info_frame2, text="Mark Attendance", font=("Segoe UI", 13, "bold"), 
-      bg="white", fg="#1976D2", cursor="hand2").pack(anchor=W)
-Label(info_frame2, text="Scan your face to record attendance", 
-      font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
+        for col in ("user_id", "name", "time"):
+            tree.heading(col, command=lambda c=col: self.sort_by(c))
+        tree.tag_configure('evenrow', background='#f9f9f9')
+        tree.tag_configure('oddrow', background='#ffffff')
 
-# Divider
-Frame(content, height=2, bg="#E0E0E0").pack(fill=X, pady=25)
+    def page_count(self):
+        return max(1, -(-self.total // self.PAGE_SIZE))
 
-# Admin section
-Label(content, text="⚙️ Administrator", font=("Segoe UI", 13, "bold"), 
-      bg="#f5f5f5", fg="#424242").pack(anchor=W, pady=(0,12))
+    def set_filter(self, date_filter=""):
+        self.date_filter = date_filter
+        self.page = 0
+        self.refresh()
+
+    def sort_by(self, column):
+        # Clicking the same heading again flips the direction
+        self.descending = not self.descending if self.sort == column else False
+        self.sort = column
+        self.page = 0
+        self.refresh()
+
+    def go_to(self, page):
+        self.page = min(max(0, page), self.page_count() - 1)
+        self.refresh()
+
+    def refresh(self):
+        self.total = count_attendance(self.date_filter)
+        self.page = min(self.page, self.page_count() - 1)
+        rows = attendance_page(self.date_filter, self.sort, self.descending,
+                               self.PAGE_SIZE, self.page * self.PAGE_SIZE)
+
+        self.tree.delete(*self.tree.get_children())
+        for count, r in enumerate(rows):
+            # Alternate row colors
+            tag = 'evenrow' if count % 2 == 0 else 'oddrow'
+            self.tree.insert("", "end", values=(r[0], r[1], r[2]), tags=(tag,))
+
+        if not rows and self.date_filter:
+            self.tree.insert("", "end", values=("", "No records found for this date", ""))
+        self.page_label.config(text=f"Page {self.page + 1} of {self.page_count()}  ({self.total} records)")
 
-admin_frame = Frame(content, bg="#f5f5f5")
-admin_frame.pack(fill=X)
 
 # ------------------------------
-# ADMIN BUTTON (Clickable everywhere)
+# STARTUP (window first, recognition engine in the background)
+# ------------------------------
+WARM_UP_MODULES = ("numpy", "cv2", "PIL.Image", "lbph_model", "matcher", "training", "registration",
+                   "preprocess", "engine", "metrics")
+
+def elapsed_ms(since=STARTED):
+    return round((time.perf_counter() - since) * 1000, 1)
+
+def warm_up(ctx):
+    """Import the recognition stack, load the face detector and the model while the window idles.
+
+    All of it also loads on first use, so a click that comes earlier just waits for it.
+    Returns the milliseconds each step took.
+    """
+    import importlib
+
+    steps = {}
+    for name in WARM_UP_MODULES:
+        started = time.perf_counter()
+        importlib.import_module(name)
+        steps[name] = elapsed_ms(started)
+    started = time.perf_counter()
+    face_detector()
+    steps["detector"] = elapsed_ms(started)
+    if os.path.exists(model_path):
+        from matcher import get_model_holder
+        started = time.perf_counter()
+        get_model_holder(model_path, load_users, users_json).current()
+        steps["model"] = elapsed_ms(started)
+    return steps
+
+
+# ------------------------------
+# MAIN GUI
 # ------------------------------
-admin_btn = Frame(admin_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
-admin_btn.pack(fill=X)
+if __name__ == "__main__":
+    multiprocessing.freeze_support()  # Needed for the process pool in the packaged EXE
+
+    parser = argparse.ArgumentParser(description="Face recognition attendance system")
+    parser.add_argument("--startup-report", metavar="FILE",
+                        help="write start-up timings (JSON) to FILE once the engine has loaded, then exit")
+    args = parser.parse_args()
+    startup = {"imports_ms": elapsed_ms(), "frozen": bool(getattr(sys, "frozen", False))}
+
+    app = Tk()
+    app.title("Face Recognition Attendance System")
+    app.geometry("600x700")
+    app.configure(bg="#f5f5f5")
+
+    # Center window
+    app.update_idletasks()
+    x = (app.winfo_screenwidth() // 2) - (600 // 2)
+    y = (app.winfo_screenheight() // 2) - (700 // 2)
+    app.geometry(f"600x700+{x}+{y}")
+
+    # Header Section
+    header = Frame(app, bg="#1976D2", height=120)
+    header.pack(fill=X)
+    header.pack_propagate(False)
+
+    Label(header, text="👤 Face Recognition", font=("Segoe UI", 24, "bold"), 
+          bg="#1976D2", fg="white").pack(pady=(20,5))
+    Label(header, text="Attendance Management System", font=("Segoe UI", 14), 
+          bg="#1976D2", fg="#E3F2FD").pack()
+
+    # Main content
+    content = Frame(app, bg="#f5f5f5")
+    content.pack(fill=BOTH, expand=True, padx=30, pady=30)
+
+    # Welcome message
+    welcome_frame = Frame(content, bg="#E3F2FD", relief=SOLID, bd=1)
+    welcome_frame.pack(fill=X, pady=(0,25))
+    Label(welcome_frame, text="Welcome! Choose an option below to get started", 
+          font=("Segoe UI", 11), bg="#E3F2FD", fg="#1565C0").pack(pady=15)
 
-def on_enter_admin(e):
-    update_bg_recursive(admin_btn, "#FFF3E0")
+    # User section
+    Label(content, text="👥 User Functions", font=("Segoe UI", 13, "bold"), 
+          bg="#f5f5f5", fg="#424242").pack(anchor=W, pady=(0,12))
 
-def on_leave_admin(e):
-    update_bg_recursive(admin_btn, "white")
+    user_frame = Frame(content, bg="#f5f5f5")
+    user_frame.pack(fill=X, pady=(0,20))
 
-admin_btn.bind("<Enter>", on_enter_admin)
-admin_btn.bind("<Leave>", on_leave_admin)
-bind_click_recursive(admin_btn, lambda e: admin_login())
+    # ------------------------------
+    # REGISTER BUTTON (Clickable everywhere)
+    # ------------------------------
+    register_btn = Frame(user_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
+    register_btn.pack(fill=X, pady=(0,12))
 
-admin_icon = Label(admin_btn, text="🔐", font=("Segoe UI", 24), bg="white", cursor="hand2")
-admin_icon.pack(side=LEFT, padx=(20,15), pady=20)
+    def on_enter_register(e):
+        update_bg_recursive(register_btn, "#E8F5E9")
 
-info_frame3 = Frame(admin_btn, bg="white", cursor="hand2")
-info_frame3.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+    def on_leave_register(e):
+        update_bg_recursive(register_btn, "white")
+
+    register_btn.bind("<Enter>", on_enter_register)
+    register_btn.bind("<Leave>", on_leave_register)
+    bind_click_recursive(register_btn, lambda e: register_face())
+
+    register_icon = Label(register_btn, text="📸", font=("Segoe UI", 24), bg="white", cursor="hand2")
+    register_icon.pack(side=LEFT, padx=(20,15), pady=20)
 
-Label(info_frame3, text="Admin Panel", font=("Segoe UI", 13, "bold"), 
-      bg="white", fg="#F57C00", cursor="hand2").pack(anchor=W)
-Label(info_frame3, text="Train model, manage users, view records", 
-      font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
+    info_frame = Frame(register_btn, bg="white", cursor="hand2")
+    info_frame.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+
+    Label(info_frame, text="Register New User", font=("Segoe UI", 13, "bold"), 
+          bg="white", fg="#2E7D32", cursor="hand2").pack(anchor=W)
+    Label(info_frame, text="Capture face images for a new user", 
+          font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
+
+    # ------------------------------
+    # ATTENDANCE BUTTON (Clickable everywhere)
+    # ------------------------------
+    attend_btn = Frame(user_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
+    attend_btn.pack(fill=X)
+
+    def on_enter_attend(e):
+        update_bg_recursive(attend_btn, "#E3F2FD")
+
+    def on_leave_attend(e):
+        update_bg_recursive(attend_btn, "white")
+
+    attend_btn.bind("<Enter>", on_enter_attend)
+    attend_btn.bind("<Leave>", on_leave_attend)
+    bind_click_recursive(attend_btn, lambda e: attendance_system())
+
+    attend_icon = Label(attend_btn, text="✓", font=("Segoe UI", 28), bg="white", cursor="hand2")
+    attend_icon.pack(side=LEFT, padx=(20,15), pady=20)
+
+    info_frame2 = Frame(attend_btn, bg="white", cursor="hand2")
+    info_frame2.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+
+    Label(info_frame2, text="Mark Attendance", font=("Segoe UI", 13, "bold"), 
+          bg="white", fg="#1976D2", cursor="hand2").pack(anchor=W)
+    Label(info_frame2, text="Scan your face to record attendance", 
+          font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
+
+    # Divider
+    Frame(content, height=2, bg="#E0E0E0").pack(fill=X, pady=25)
+
+    # Admin section
+    Label(content, text="⚙️ Administrator", font=("Segoe UI", 13, "bold"), 
+          bg="#f5f5f5", fg="#424242").pack(anchor=W, pady=(0,12))
+
+    admin_frame = Frame(content, bg="#f5f5f5")
+    admin_frame.pack(fill=X)
+
+    # ------------------------------
+    # ADMIN BUTTON (Clickable everywhere)
+    # ------------------------------
+    admin_btn = Frame(admin_frame, bg="white", relief=SOLID, bd=1, cursor="hand2")
+    admin_btn.pack(fill=X)
+
+    def on_enter_admin(e):
+        update_bg_recursive(admin_btn, "#FFF3E0")
+
+    def on_leave_admin(e):
+        update_bg_recursive(admin_btn, "white")
+
+    admin_btn.bind("<Enter>", on_enter_admin)
+    admin_btn.bind("<Leave>", on_leave_admin)
+    bind_click_recursive(admin_btn, lambda e: admin_login())
+
+    admin_icon = Label(admin_btn, text="🔐", font=("Segoe UI", 24), bg="white", cursor="hand2")
+    admin_icon.pack(side=LEFT, padx=(20,15), pady=20)
+
+    info_frame3 = Frame(admin_btn, bg="white", cursor="hand2")
+    info_frame3.pack(side=LEFT, fill=BOTH, expand=True, pady=20)
+
+    Label(info_frame3, text="Admin Panel", font=("Segoe UI", 13, "bold"), 
+          bg="white", fg="#F57C00", cursor="hand2").pack(anchor=W)
+    Label(info_frame3, text="Train model, manage users, view records", 
+          font=("Segoe UI", 9), bg="white", fg="#666", cursor="hand2").pack(anchor=W)
 
-# Footer
-footer = Frame(app, bg="#EEEEEE", height=50)
-footer.pack(side=BOTTOM, fill=X)
-footer.pack_propagate(False)
+    # Footer
+    footer = Frame(app, bg="#EEEEEE", height=50)
+    footer.pack(side=BOTTOM, fill=X)
+    footer.pack_propagate(False)
 
-Label(footer, text="💡 Tip: Register first, then admin must train model before attendance works", 
-      font=("Segoe UI", 9), bg="#EEEEEE", fg="#616161").pack(pady=15)
+    tip_text = "💡 Tip: Register first, then admin must train model before attendance works"
+    tip_label = Label(footer, text="⏳ Loading face recognition engine...", 
+                      font=("Segoe UI", 9), bg="#EEEEEE", fg="#616161")
+    tip_label.pack(pady=15)
+
+    def on_warmed_up(steps):
+        tip_label.config(text=tip_text)
+        startup.update(ready_ms=elapsed_ms(), steps=steps)
+        if args.startup_report:
+            with open(args.startup_report, "w") as f:
+                json.dump(startup, f, indent=2)
+            app.destroy()
 
-app.mainloop()
\ No newline at end of file
+    def on_warm_up_failed(error):
+        # Not fatal: each feature loads what it needs when it is used
+        print(f"Background warm-up failed: {error}")
+        tip_label.config(text=tip_text)
+
+    def on_window_shown():
+        startup["window_ms"] = elapsed_ms()
+        start_job("warm-up", warm_up, on_done=on_warmed_up, on_error=on_warm_up_failed)
+
+    app.protocol("WM_DELETE_WINDOW", cancel_jobs_and_quit)
+    app.after(1, on_window_shown)
+    app.mainloop()
\ No newline at end of file
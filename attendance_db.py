@@ -0,0 +1,285 @@
+import os
+import csv
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+
+# ------------------------------
+# SQLite attendance store
+# ------------------------------
+CSV_HEADER = ["User ID", "Name", "Time"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance (
+    id      INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    name    TEXT NOT NULL,
+    day     TEXT NOT NULL,
+    time    TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_user_day ON attendance (user_id, day);
+CREATE INDEX IF NOT EXISTS idx_attendance_time ON attendance (time);
+CREATE INDEX IF NOT EXISTS idx_attendance_user_time ON attendance (user_id, time);
+CREATE INDEX IF NOT EXISTS idx_attendance_name_time ON attendance (name, time);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+
+CREATE TABLE IF NOT EXISTS daily_rollup (
+    day        TEXT NOT NULL,
+    user_id    TEXT NOT NULL,
+    name       TEXT NOT NULL,
+    records    INTEGER NOT NULL,
+    first_time TEXT NOT NULL,
+    late       INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_rollup_user ON daily_rollup (user_id);
+CREATE TABLE IF NOT EXISTS monthly_rollup (
+    month     TEXT NOT NULL,
+    user_id   TEXT NOT NULL,
+    name      TEXT NOT NULL,
+    days      INTEGER NOT NULL,
+    late_days INTEGER NOT NULL,
+    records   INTEGER NOT NULL,
+    PRIMARY KEY (month, user_id)
+);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day       TEXT PRIMARY KEY,
+    attendees INTEGER NOT NULL,
+    late      INTEGER NOT NULL,
+    records   INTEGER NOT NULL
+);
+"""
+
+REBUILD_ROLLUPS = """
+DELETE FROM daily_rollup;
+DELETE FROM monthly_rollup;
+DELETE FROM daily_totals;
+INSERT INTO daily_rollup (day, user_id, name, records, first_time, late)
+    SELECT day, user_id, MAX(name), COUNT(*), MIN(time), substr(MIN(time), 12) > :late_after
+    FROM attendance GROUP BY day, user_id;
+INSERT INTO monthly_rollup (month, user_id, name, days, late_days, records)
+    SELECT substr(day, 1, 7), user_id, MAX(name), COUNT(*), SUM(late), SUM(records)
+    FROM daily_rollup GROUP BY substr(day, 1, 7), user_id;
+INSERT INTO daily_totals (day, attendees, late, records)
+    SELECT day, COUNT(*), SUM(late), SUM(records) FROM daily_rollup GROUP BY day;
+"""
+
+REPORT_HEADERS = {
+    "summary": ["User ID", "Name", "Days Present", "Late Days", "Records"],
+    "daily": ["Date", "Attendees", "Late", "Records"],
+}
+
+# Sortable grid columns; each has an index whose trailing columns give a stable order
+SORT_COLUMNS = {"user_id": "user_id, time", "name": "name, time", "time": "time"}
+
+def time_range(prefix):
+    """Bounds matching every "YYYY-MM-DD HH:MM:SS" timestamp that starts with `prefix`"""
+    return prefix, prefix + "\uffff"
+
+
+def month_bounds(month):
+    """First and last "YYYY-MM-DD" of a "YYYY-MM" month"""
+    first = date(int(month[:4]), int(month[5:7]), 1)
+    following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+    return first.isoformat(), (following - timedelta(days=1)).isoformat()
+
+def next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year + mon // 12:04d}-{mon % 12 + 1:02d}"
+
+def prev_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return f"{year - (mon == 1):04d}-{(mon - 2) % 12 + 1:02d}"
+
+def write_report_csv(path, header, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+class AttendanceDB:
+    """Attendance rows in SQLite (WAL mode), indexed on (user_id, day) and on time.
+
+    Daily and monthly per-user rollups are updated in the same transaction as each
+    append, so reports never read the raw rows. A user's first record of the day
+    counts as late when its time of day is after `late_after` ("HH:MM:SS").
+    """
+
+    def __init__(self, path, late_after="09:00:00"):
+        self.path = path
+        self.late_after = late_after
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+        # Databases from before the rollups existed, or with another cutoff, are rebuilt once
+        if self._meta("rollup_late_after") != late_after:
+            self.rebuild_rollups()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def _query(self, sql, params=()):
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, params=()):
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params).rowcount
+
+    def _meta(self, key):
+        row = self._query("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0][0] if row else None
+
+    # ---- migration / export ----
+    def migrate_csv(self, csv_path):
+        """One-time import of an existing attendance.csv; returns the number of rows imported"""
+        if self._meta("csv_migrated") is not None:
+            return 0
+        rows = []
+        if os.path.exists(csv_path):
+            with open(csv_path, "r", newline="") as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                rows = [(r[0], r[1], r[2][:10], r[2]) for r in reader if len(r) >= 3]
+        with self.lock, self.conn:
+            self.conn.executemany("INSERT INTO attendance (user_id, name, day, time) VALUES (?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('csv_migrated', ?)",
+                              (str(len(rows)),))
+        if rows:
+            self.rebuild_rollups()
+        return len(rows)
+
+    def export_csv(self, csv_path):
+        """Write every row to a CSV with the original User ID/Name/Time layout"""
+        tmp_path = csv_path + ".tmp"
+        with self.lock:
+            cursor = self.conn.execute("SELECT user_id, name, time FROM attendance ORDER BY id")
+            with open(tmp_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(CSV_HEADER)
+                for chunk in iter(lambda: cursor.fetchmany(5000), []):
+                    writer.writerows(chunk)
+        os.replace(tmp_path, csv_path)
+
+    # ---- writes ----
+    def append(self, user_id, name, timestamp):
+        user_id, day = str(user_id), timestamp[:10]
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO attendance (user_id, name, day, time) VALUES (?, ?, ?, ?)",
+                              (user_id, name, day, timestamp))
+            self._roll_up(user_id, name, day, timestamp)
+
+    def _roll_up(self, user_id, name, day, timestamp):
+        c = self.conn
+        late = int(timestamp[11:] > self.late_after)
+        row = c.execute("SELECT first_time, late FROM daily_rollup WHERE day = ? AND user_id = ?",
+                        (day, user_id)).fetchone()
+        if row is None:
+            c.execute("INSERT INTO daily_rollup VALUES (?, ?, ?, 1, ?, ?)", (day, user_id, name, timestamp, late))
+            c.execute("INSERT INTO monthly_rollup VALUES (?, ?, ?, 1, ?, 1) ON CONFLICT (month, user_id) DO UPDATE "
+                      "SET name = excluded.name, days = days + 1, late_days = late_days + excluded.late_days, "
+                      "records = records + 1", (day[:7], user_id, name, late))
+            c.execute("INSERT INTO daily_totals VALUES (?, 1, ?, 1) ON CONFLICT (day) DO UPDATE "
+                      "SET attendees = attendees + 1, late = late + excluded.late, records = records + 1",
+                      (day, late))
+            return
+
+        # Another record the same day; lateness only changes if it is earlier than the first
+        first_time, old_late = row
+        late = late if timestamp < first_time else old_late
+        c.execute("UPDATE daily_rollup SET name = ?, records = records + 1, first_time = MIN(first_time, ?), "
+                  "late = ? WHERE day = ? AND user_id = ?", (name, timestamp, late, day, user_id))
+        c.execute("UPDATE monthly_rollup SET name = ?, records = records + 1, late_days = late_days + ? "
+                  "WHERE month = ? AND user_id = ?", (name, late - old_late, day[:7], user_id))
+        c.execute("UPDATE daily_totals SET records = records + 1, late = late + ? WHERE day = ?",
+                  (late - old_late, day))
+
+    def rebuild_rollups(self):
+        """Recompute every rollup from the raw rows (after a migration or a cutoff change)"""
+        with self.lock, self.conn:
+            for statement in REBUILD_ROLLUPS.strip().split(";"):
+                if statement.strip():
+                    self.conn.execute(statement, {"late_after": self.late_after})
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_late_after', ?)",
+                              (self.late_after,))
+
+    def delete_user(self, user_id):
+        user_id = str(user_id)
+        with self.lock, self.conn:
+            c = self.conn
+            deleted = c.execute("DELETE FROM attendance WHERE user_id = ?", (user_id,)).rowcount
+            days = c.execute("SELECT day, late, records FROM daily_rollup WHERE user_id = ?", (user_id,)).fetchall()
+            c.executemany("UPDATE daily_totals SET attendees = attendees - 1, late = late - ?, "
+                          "records = records - ? WHERE day = ?", [(late, n, day) for day, late, n in days])
+            c.execute("DELETE FROM daily_totals WHERE attendees <= 0")
+            c.execute("DELETE FROM daily_rollup WHERE user_id = ?", (user_id,))
+            c.execute("DELETE FROM monthly_rollup WHERE user_id = ?", (user_id,))
+        return deleted
+
+    # ---- reads ----
+    def attended_on(self, user_id, day):
+        return bool(self._query("SELECT 1 FROM attendance WHERE user_id = ? AND day = ? LIMIT 1",
+                                (str(user_id), day)))
+
+    def user_ids_on(self, day):
+        return {r[0] for r in self._query("SELECT DISTINCT user_id FROM attendance WHERE time >= ? AND time < ?",
+                                          time_range(day))}
+
+    def count(self, time_prefix=""):
+        if not time_prefix:
+            return self._query("SELECT COUNT(*) FROM attendance")[0][0]
+        return self._query("SELECT COUNT(*) FROM attendance WHERE time >= ? AND time < ?",
+                           time_range(time_prefix))[0][0]
+
+    def rows(self, time_prefix="", sort=None, descending=False, limit=-1, offset=0):
+        """[user_id, name, time] rows, optionally filtered by timestamp prefix.
+
+        Rows come in insertion order unless `sort` names a SORT_COLUMNS key. `limit` and
+        `offset` select one page, so a grid only ever reads the rows it shows.
+        """
+        direction = "DESC" if descending else "ASC"
+        columns = (SORT_COLUMNS[sort] + ", id").split(", ") if sort else ["id"]
+        order = ", ".join(f"{c} {direction}" for c in columns)
+        where, params = "", ()
+        if time_prefix:
+            where, params = "WHERE time >= ? AND time < ?", time_range(time_prefix)
+        result = self._query(f"SELECT user_id, name, time FROM attendance {where} "
+                             f"ORDER BY {order} LIMIT ? OFFSET ?", params + (limit, offset))
+        return [list(r) for r in result]
+
+    # ---- reports (answered from the rollups) ----
+    def range_summary(self, start_day, end_day):
+        """Per-user [user_id, name, days present, late days, records] for start_day..end_day.
+
+        Whole months inside the range are read from the monthly rollup and only the
+        partial months at either end from the daily one.
+        """
+        first_month = start_day[:7] if start_day.endswith("-01") else next_month(start_day[:7])
+        last_month = end_day[:7] if end_day == month_bounds(end_day[:7])[1] else prev_month(end_day[:7])
+
+        days = "SELECT user_id, name, 1 AS days, late AS late_days, records FROM daily_rollup"
+        if first_month <= last_month:
+            sql = (f"SELECT user_id, name, days, late_days, records FROM monthly_rollup "
+                   f"WHERE month >= ? AND month <= ? "
+                   f"UNION ALL {days} WHERE (day >= ? AND day < ?) OR (day > ? AND day <= ?)")
+            # "-32" sorts after every day of last_month and before the next month
+            params = (first_month, last_month, start_day, first_month + "-01", last_month + "-32", end_day)
+        else:
+            sql = f"{days} WHERE day >= ? AND day <= ?"
+            params = (start_day, end_day)
+
+        result = self._query(f"SELECT user_id, MAX(name), SUM(days), SUM(late_days), SUM(records) FROM ({sql}) "
+                             "GROUP BY user_id ORDER BY CAST(user_id AS INTEGER), user_id", params)
+        return [list(r) for r in result]
+
+    def daily_totals(self, start_day, end_day):
+        """[day, attendees, late, records] for each day with attendance in the range"""
+        result = self._query("SELECT day, attendees, late, records FROM daily_totals "
+                             "WHERE day >= ? AND day <= ? ORDER BY day", (start_day, end_day))
+        return [list(r) for r in result]
@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import cv2
+import numpy as np
+
+from engine import DownscaledDetector, create_backend
+from matcher import load_matcher
+from preprocess import default_normalizer
+
+
+# ------------------------------
+# Job file reading / path resolution
+# ------------------------------
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+def read_jobs(path):
+    """Yield (line number, job dict or None, error or None) for each non-blank line, streaming"""
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(job, dict):
+                yield number, None, "job must be a JSON object"
+                continue
+            yield number, job, None
+
+def resolve_images(job, base_dir):
+    """Image paths named by a job's "image", "images" and/or "folder" fields"""
+    resolve = lambda p: os.path.normpath(p if os.path.isabs(p) else os.path.join(base_dir, p))
+    paths = []
+    for field in ("image", "folder"):
+        if job.get(field) and not isinstance(job[field], str):
+            raise ValueError(f'"{field}" must be a path string')
+    images = job.get("images") or []
+    if not isinstance(images, list) or not all(isinstance(p, str) for p in images):
+        raise ValueError('"images" must be a list of path strings')
+    if job.get("image"):
+        paths.append(resolve(job["image"]))
+    paths.extend(resolve(p) for p in images)
+    if job.get("folder"):
+        folder = resolve(job["folder"])
+        if not os.path.isdir(folder):
+            raise ValueError(f"folder not found: {job['folder']}")
+        try:
+            names = sorted(os.listdir(folder))
+        except OSError as e:
+            raise ValueError(f"cannot list folder {job['folder']}: {e.strerror or e}") from e
+        paths.extend(os.path.join(folder, f) for f in names if f.lower().endswith(IMAGE_EXTENSIONS))
+    if not paths:
+        raise ValueError('job has no "image", "images" or "folder"')
+    return paths
+
+def finished_lines(output_path):
+    """Line numbers already written to the output, so a rerun can skip them.
+
+    A torn last line from an interrupted run (no trailing newline) is dropped from the
+    file; other unreadable lines are reported and skipped.
+    """
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    good_size = 0
+    with open(output_path, "rb") as f:
+        for number, raw in enumerate(f, 1):
+            if not raw.endswith(b"\n"):
+                break
+            good_size += len(raw)
+            if not raw.strip():
+                continue
+            try:
+                done.add(int(json.loads(raw)["line"]))
+            except (ValueError, KeyError, TypeError):
+                print(f"{output_path}:{number}: skipping unreadable result", file=sys.stderr)
+    if good_size != os.path.getsize(output_path):
+        with open(output_path, "r+b") as f:
+            f.truncate(good_size)
+    return done
+
+
+# ------------------------------
+# Worker side: detection + batched prediction
+# ------------------------------
+_state = {}
+
+def _init_worker(detector_spec, model_path, users, candidates, single_thread=True):
+    if single_thread:
+        cv2.setNumThreads(1)  # The pool provides the parallelism
+    _state["detector"] = DownscaledDetector(create_backend(*detector_spec))
+    # Memory-mapped binary model: every worker shares the same pages
+    _state["matcher"] = load_matcher(model_path, candidates=candidates)
+    _state["users"] = users
+
+def read_gray(path):
+    # imdecode(fromfile) also copes with non-ASCII paths on Windows
+    data = np.fromfile(path, np.uint8)
+    return cv2.imdecode(data, cv2.IMREAD_GRAYSCALE) if data.size else None
+
+def _recognize_chunk(paths):
+    """Detect faces in every image, then predict all of the chunk's faces in one batch"""
+    detector, matcher, users = _state["detector"], _state["matcher"], _state["users"]
+    normalize = default_normalizer()
+    results, crops, owners = [], [], []
+    for path in paths:
+        try:
+            gray = read_gray(path)
+        except OSError as e:
+            results.append({"image": path, "error": str(e)})
+            continue
+        if gray is None:
+            results.append({"image": path, "error": "unreadable image"})
+            continue
+        entry = {"image": path, "faces": []}
+        for (x, y, w, h) in detector.detect(gray):
+            crops.append(normalize(gray[y:y + h, x:x + w]))
+            owners.append((entry, (x, y, w, h)))
+        results.append(entry)
+
+    for (entry, bbox), (label, conf) in zip(owners, matcher.predict_batch(crops)):
+        entry["faces"].append({"user_id": int(label), "name": users.get(str(label), "Unknown"),
+                               "confidence": round(float(conf), 2), "bbox": list(bbox)})
+    return results
+
+
+# ------------------------------
+# Batch processor
+# ------------------------------
+def process_jobs(jobs_path, output_path, detector_spec, model_path, users, workers=1, batch_size=16,
+                 window=256, base_dir=None, candidates=None, on_result=None, progress=None):
+    """Run every job in `jobs_path` not already in `output_path`; returns a summary dict.
+
+    `detector_spec` is a (backend, model path) pair, see engine.create_backend().
+
+    Jobs are read in windows of about `window` images; each window's images are split
+    into `batch_size` chunks spread over the pool, and its results are appended to the
+    output (one line per job, in input order) before the next window is read.
+    """
+    base_dir = base_dir or os.path.dirname(os.path.abspath(jobs_path))
+    done = finished_lines(output_path)
+    summary = {"jobs": 0, "skipped": len(done), "images": 0, "faces": 0, "errors": 0}
+    started = time.perf_counter()
+
+    pool = None
+    if workers > 1:
+        ctx = multiprocessing.get_context("spawn")
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                   initargs=(detector_spec, model_path, users, candidates))
+    else:
+        _init_worker(detector_spec, model_path, users, candidates, single_thread=False)
+
+    def run_window(pending, out):
+        paths = [p for _, _, job_paths, _ in pending for p in job_paths]
+        chunks = [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        mapped = pool.map(_recognize_chunk, chunks) if pool else map(_recognize_chunk, chunks)
+        by_path = iter([r for chunk in mapped for r in chunk])
+        for number, job, job_paths, error in pending:
+            record = {"line": number, "id": job.get("id") if job else None}
+            if error:
+                record["error"] = error
+                summary["errors"] += 1
+            else:
+                record["results"] = [next(by_path) for _ in job_paths]
+                summary["images"] += len(job_paths)
+                summary["faces"] += sum(len(r.get("faces", [])) for r in record["results"])
+                summary["errors"] += sum(1 for r in record["results"] if "error" in r)
+            if on_result:
+                on_result(record, job)
+            out.write(json.dumps(record) + "\n")
+            summary["jobs"] += 1
+        out.flush()  # Everything written so far survives an interruption
+        if progress:
+            progress(summary)
+
+    try:
+        with open(output_path, "a", encoding="utf-8") as out:
+            pending, pending_images = [], 0
+            for number, job, error in read_jobs(jobs_path):
+                if number in done:
+                    continue
+                paths = []
+                if job is not None:
+                    try:
+                        paths = resolve_images(job, base_dir)
+                    except ValueError as e:
+                        error = str(e)
+                pending.append((number, job, paths, error))
+                pending_images += len(paths)
+                if pending_images >= window:
+                    run_window(pending, out)
+                    pending, pending_images = [], 0
+            if pending:
+                run_window(pending, out)
+    finally:
+        if pool:
+            pool.shutdown()
+
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    return summary
+
+
+# ------------------------------
+# Command line
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize faces in still images listed in a JSONL jobs file")
+    parser.add_argument("jobs", nargs="?", default="requests.jsonl",
+                        help='JSONL file, one job per line: {"id": ..., "image": path | "images": [...] | "folder": dir}')
+    parser.add_argument("--output", default="results.jsonl",
+                        help="results JSONL; jobs already in it are skipped, so an interrupted run resumes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=16, help="images per worker task")
+    parser.add_argument("--base-dir", help="resolve relative image paths here (default: the jobs file's folder)")
+    parser.add_argument("--prune", type=int, default=0,
+                        help="compare only the N closest users' samples on rosters of 500+ users (0 = off)")
+    parser.add_argument("--record", action="store_true",
+                        help='write attendance for recognized faces in jobs with "record": true')
+    args = parser.parse_args(argv)
+
+    import common
+
+    detector_spec = common.detector_spec()
+    if detector_spec[1] is None or not os.path.exists(detector_spec[1]):
+        print("Face detector not found.", file=sys.stderr)
+        return 1
+    if not os.path.exists(common.model_path):
+        print("Model not trained yet.", file=sys.stderr)
+        return 1
+    if not os.path.exists(args.jobs):
+        print(f"Jobs file not found: {args.jobs}", file=sys.stderr)
+        return 1
+
+    def record_attendance(record, job):
+        # Attendance is written here in the parent only, after the dedupe check
+        if not (args.record and job and job.get("record")):
+            return
+        for result in record.get("results", []):
+            for face in result.get("faces", []):
+                uid = str(face["user_id"])
+                if face["name"] != "Unknown" and not common.today_attendance.contains(uid):
+                    common.append_attendance(uid, face["name"])
+
+    load_matcher(common.model_path)  # Refresh the binary model once, before workers map it
+    summary = process_jobs(args.jobs, args.output, detector_spec, common.model_path, common.load_users(),
+                           workers=max(1, args.workers), batch_size=max(1, args.batch_size),
+                           base_dir=args.base_dir, candidates=args.prune or None,
+                           on_result=record_attendance,
+                           progress=lambda s: print(f"{s['jobs']} jobs, {s['images']} images", file=sys.stderr))
+    print(json.dumps(summary), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
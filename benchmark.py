@@ -0,0 +1,475 @@
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timedelta
+import cv2
+import numpy as np
+
+import lbph_model
+import training
+from engine import (DETECTOR_BACKENDS, MotionGatedDetector, backend_strategies, box_iou, create_backend,
+                    default_detector, evaluate_detectors)
+from matcher import LBPHMatcher
+from attendance_db import AttendanceDB
+
+
+# ------------------------------
+# Synthetic data (no camera, no dataset needed)
+# ------------------------------
+def synthetic_face(size=100, seed=0):
+    """A cartoon face the Haar cascade detects; `seed` varies the geometry like an identity"""
+    rng = np.random.default_rng(seed)
+    s = size
+    j = lambda scale: 1.0 + rng.uniform(-scale, scale)
+    img = np.full((s, s), int(rng.integers(70, 110)), np.uint8)
+    cv2.ellipse(img, (s // 2, s // 2), (int(s * .36 * j(.05)), int(s * .46 * j(.04))), 0, 0, 360,
+                int(rng.integers(170, 210)), -1)
+    spread = .17 * j(.15)
+    for ex in (.5 - spread, .5 + spread):
+        cv2.ellipse(img, (int(s * ex), int(s * .40 * j(.04))), (int(s * .09 * j(.2)), int(s * .045 * j(.2))),
+                    0, 0, 360, int(rng.integers(30, 70)), -1)
+        cv2.line(img, (int(s * (ex - .1)), int(s * .31)), (int(s * (ex + .1)), int(s * .31 * j(.1))),
+                 int(rng.integers(50, 90)), max(2, s // 30))
+    cv2.line(img, (s // 2, int(s * .45)), (s // 2, int(s * .62 * j(.05))), 150, max(2, s // 40))
+    cv2.ellipse(img, (s // 2, int(s * .74 * j(.03))), (int(s * .15 * j(.25)), int(s * .04 * j(.3))),
+                0, 0, 360, int(rng.integers(60, 100)), -1)
+    img = cv2.GaussianBlur(img, (0, 0), s / 80)
+    return np.clip(img + rng.normal(0, 6, img.shape), 0, 255).astype(np.uint8)
+
+def face_sample(base, seed):
+    """One capture of a face: small shift, rotation, brightness change and noise"""
+    rng = np.random.default_rng(seed)
+    h, w = base.shape
+    m = cv2.getRotationMatrix2D((w / 2.0, h / 2.0), float(rng.normal(0, 4)), float(1 + rng.normal(0, .03)))
+    m[:, 2] += rng.integers(-3, 4, 2)
+    img = cv2.warpAffine(base, m, (w, h), borderMode=cv2.BORDER_REPLICATE).astype(np.float32)
+    return np.clip(img * rng.uniform(.85, 1.15) + rng.normal(0, 4, img.shape), 0, 255).astype(np.uint8)
+
+def synthetic_frame(width, height, seed=0, face=None, with_box=False):
+    """A BGR frame with one face about a third of the frame height tall (and its box, with_box=True)"""
+    rng = np.random.default_rng(seed)
+    gray = cv2.resize(rng.integers(60, 180, (height // 16 + 1, width // 16 + 1)).astype(np.uint8),
+                      (width, height), interpolation=cv2.INTER_LINEAR)
+    size = max(40, height // 3)
+    face = cv2.resize(face if face is not None else synthetic_face(size, seed), (size, size))
+    x = int(rng.integers(0, width - size))
+    y = int(rng.integers(0, height - size))
+    gray[y:y + size, x:x + size] = face
+    frame = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    return (frame, (x, y, size, size)) if with_box else frame
+
+def hallway_clip(width, height, visits=2, idle=150, walk=15, stay=30, seed=0, face=None):
+    """Grayscale frames of an empty scene with sensor noise that people walk into now and then.
+
+    Returns (frames, truth, arrivals, occupied): truth holds each frame's fully visible face
+    boxes, arrivals the frame index at which each visitor is first fully in view, and
+    occupied whether any part of a visitor is in the frame.
+    """
+    rng = np.random.default_rng(seed)
+    scene = cv2.resize(rng.integers(60, 180, (height // 16 + 1, width // 16 + 1)).astype(np.uint8),
+                       (width, height), interpolation=cv2.INTER_LINEAR).astype(np.float32)
+    size = max(40, height // 3)
+    y = (height - size) // 2
+    frames, truth, arrivals, occupied = [], [], [], []
+
+    def add(face_img=None, x=0):
+        gray = scene + rng.normal(0, 2.0, scene.shape).astype(np.float32)
+        boxes = []
+        if face_img is not None:
+            x0, x1 = max(0, x), min(width, x + size)
+            gray[y:y + size, x0:x1] = face_img[:, x0 - x:x1 - x]
+            if x0 == x and x1 == x + size:
+                boxes.append((x, y, size, size))
+        frames.append(np.clip(gray, 0, 255).astype(np.uint8))
+        truth.append(boxes)
+        occupied.append(face_img is not None)
+
+    for visit in range(visits):
+        for _ in range(idle):
+            add()
+        person = cv2.resize(face if face is not None else synthetic_face(size, seed=visit), (size, size))
+        stop_x = (width - size) // 2
+        for step in range(1, walk + 1):
+            add(person, -size + (stop_x + size) * step // walk)
+        arrivals.append(len(frames) - 1)
+        for _ in range(stay):
+            add(person, stop_x)
+    return frames, truth, arrivals, occupied
+
+
+# ------------------------------
+# Timing helpers
+# ------------------------------
+def timed(fn, repeat=1):
+    """Median wall time of fn() in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    return round(float(np.median(samples)), 3)
+
+
+# ------------------------------
+# Benchmarks
+# ------------------------------
+def bench_detection(backends, resolutions, frames=30, subjects=5, face=None):
+    """FPS and recall of every backend and detection strategy at several resolutions.
+
+    Each of `subjects` synthetic people stands still for a share of the clip, as at a
+    kiosk; recall is measured against the known face boxes.
+    """
+    results = []
+    for width, height in resolutions:
+        clip, truth = [], []
+        for subject in range(subjects):
+            frame, box = synthetic_frame(width, height, seed=subject, face=face, with_box=True)
+            clip += [frame] * (frames // subjects)
+            truth += [[box]] * (frames // subjects)
+        report = evaluate_detectors(clip, backend_strategies(backends), truth=truth)
+        for name, r in report.items():
+            results.append({"resolution": f"{width}x{height}", "detector": name,
+                            "ms_per_frame": round(r["ms_per_frame"], 3), "fps": round(r["fps"], 1),
+                            "recall": round(r["recall"], 3)})
+    return results
+
+def bench_motion(backends, resolutions, camera_fps=30, min_check_hz=1.0, face=None):
+    """Cost on an idle camera and wake-up latency, with and without the motion gate.
+
+    The clock is driven by the frame index at `camera_fps`, so min_check_hz behaves as
+    it would live. Idle frames are those at least two seconds after anyone was in view;
+    idle_cpu_percent is the share of one core detection needs on them at that frame rate
+    (over 100 means frames would be dropped). wake_ms is how long after a visitor is
+    fully in view the detector first reports their face.
+    """
+    results = []
+    settle = 2 * camera_fps
+    for width, height in resolutions:
+        frames, truth, arrivals, occupied = hallway_clip(width, height, face=face)
+        idle = [not any(occupied[max(0, i - settle):i + 1]) for i in range(len(frames))]
+        for backend, base in backends.items():
+            for gated in (False, True):
+                index = [0]
+                detector = default_detector(base)
+                if gated:
+                    detector = MotionGatedDetector(detector, min_check_hz, clock=lambda: index[0] / camera_fps)
+                detector.reset()
+                found, elapsed = [], []
+                for i, gray in enumerate(frames):
+                    index[0] = i
+                    started = time.perf_counter()
+                    found.append(detector.detect(gray))
+                    elapsed.append(time.perf_counter() - started)
+                elapsed = np.array(elapsed) * 1000.0
+                idle_ms = float(elapsed[np.array(idle)].mean())
+
+                hit = [any(box_iou(t, b) >= 0.5 for b in boxes for t in expected) if expected else None
+                       for boxes, expected in zip(found, truth)]
+                wakes = []
+                for arrival in arrivals:
+                    first = next((i for i in range(arrival, len(frames)) if hit[i] or not truth[i]), None)
+                    if first is not None and hit[first]:
+                        wakes.append((first - arrival) * 1000.0 / camera_fps)
+                scored = [h for h in hit if h is not None]
+                results.append({
+                    "resolution": f"{width}x{height}", "detector": backend,
+                    "motion_gate": gated,
+                    "idle_ms_per_frame": round(idle_ms, 3),
+                    "idle_cpu_percent": round(idle_ms * camera_fps / 10.0, 1),
+                    "active_ms_per_frame": round(float(elapsed[~np.array(idle)].mean()), 3),
+                    "detections_run": detector.checks if gated else len(frames),
+                    "frames": len(frames),
+                    "recall": round(sum(scored) / len(scored), 3) if scored else 1.0,
+                    "wake_ms": round(max(wakes), 1) if len(wakes) == len(arrivals) else None,
+                })
+    return results
+
+def bench_predict(rosters, per_user=2, queries=20, cv2_max_samples=2000):
+    """Latency of one prediction against rosters of increasing size"""
+    results = []
+    query_faces = [face_sample(synthetic_face(100, seed=u), seed=10_000 + u) for u in range(queries)]
+    for users in rosters:
+        faces, labels = [], []
+        for u in range(users):
+            base = synthetic_face(100, seed=u)
+            for k in range(per_user):
+                faces.append(face_sample(base, seed=u * 1000 + k))
+                labels.append(u)
+        labels = np.array(labels, np.int32)
+
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        started = time.perf_counter()
+        recognizer.train(faces, labels)
+        train_ms = (time.perf_counter() - started) * 1000.0
+        hists = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+        faces = None
+
+        row = {"users": users, "samples": int(len(labels)), "train_ms": round(train_ms, 1)}
+        reference = None
+        if len(labels) <= cv2_max_samples:
+            row["cv2_predict_ms"] = timed(lambda: [recognizer.predict(f) for f in query_faces]) / queries
+            reference = [recognizer.predict(f)[0] for f in query_faces]
+        recognizer = None  # Free its copy of the histograms before building the matcher
+
+        # Mismatches count predicted labels that differ from cv2's (from the exact matcher's
+        # when cv2 is skipped)
+        matcher = LBPHMatcher(hists, labels)
+        row["matcher_predict_ms"] = timed(lambda: [matcher.predict(f) for f in query_faces]) / queries
+        row["matcher_batch_ms_per_face"] = timed(lambda: matcher.predict_batch(query_faces)) / queries
+        predicted = [label for label, _ in matcher.predict_batch(query_faces)]
+        matcher = None  # One matcher in memory at a time: each holds two copies of the histograms
+        if reference is None:
+            row["mismatch_reference"], reference = "matcher", predicted
+        else:
+            row["mismatch_reference"] = "cv2"
+            row["matcher_mismatches"] = sum(a != b for a, b in zip(predicted, reference))
+        variants = {"approx": {"exact": False}}
+        if users > 10:
+            variants["pruned"] = {"candidates": 10}
+        for name, options in variants.items():
+            variant = LBPHMatcher(hists, labels, **options)
+            row[f"{name}_predict_ms"] = timed(lambda: [variant.predict(f) for f in query_faces]) / queries
+            row[f"{name}_mismatches"] = sum(label != b for (label, _), b in
+                                            zip(variant.predict_batch(query_faces), reference))
+            variant = None
+        for key in list(row):
+            if key.endswith("_ms") or key.endswith("_face"):
+                row[key] = round(row[key], 3)
+        results.append(row)
+    return results
+
+def bench_training(sizes, per_user=20, workers=None):
+    """Full training time against dataset size, cold and with a warm sample cache"""
+    results = []
+    workers = workers or training.default_workers()
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="bench_train_")
+        try:
+            data = os.path.join(root, "Data")
+            os.makedirs(data)
+            users = max(1, size // per_user)
+            for u in range(users):
+                base = synthetic_face(100, seed=u)
+                for k in range(per_user):
+                    cv2.imwrite(os.path.join(data, f"User.{u + 1}.{k + 1}.jpg"), face_sample(base, u * 1000 + k))
+            files = sorted(os.listdir(data))
+            model = os.path.join(root, "model.xml")
+            cache_path = os.path.join(root, "cache.pkl")
+
+            def serial():
+                faces, ids = training.collect_samples(data, files, training.SampleCache(cache_path))
+                training.write_pruned_model(model, training.compute_histograms(faces), ids)
+
+            row = {"samples": len(files), "users": users, "workers": workers}
+            row["serial_cold_ms"] = timed(serial)
+            row["serial_warm_ms"] = timed(serial)
+            if workers > 1:
+                os.remove(cache_path)
+                row["parallel_cold_ms"] = timed(lambda: training.train_files(
+                    data, files, model, training.SampleCache(cache_path), workers, min_parallel=1))
+            row["export_binary_ms"] = timed(lambda: lbph_model.export_binary(model))
+            new_faces = [face_sample(synthetic_face(100, seed=10 ** 6), k) for k in range(per_user)]
+            row["enroll_one_user_ms"] = timed(lambda: lbph_model.add_user(model, new_faces, 10 ** 6))
+            results.append(row)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def bench_enroll(sizes, per_user=20):
+    """Enrolling and removing one user against model size, next to a full model rewrite"""
+    from matcher import face_histograms, load_matcher
+
+    results = []
+    new_faces = [face_sample(synthetic_face(100, seed=10 ** 6), k) for k in range(per_user)]
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="bench_enroll_")
+        try:
+            # Histograms of a few real faces, repeated: only the model's size matters here
+            users = max(1, size // per_user)
+            seeds = face_histograms([face_sample(synthetic_face(100, seed=u), u) for u in range(min(users, 50))])
+            histograms = seeds[np.arange(size) % len(seeds)]
+            labels = np.arange(size, dtype=np.int32) // per_user + 1
+            model = os.path.join(root, "model.xml")
+            lbph_model.write_model(model, lbph_model.DEFAULT_PARAMS, histograms, labels)
+            lbph_model.export_binary(model)
+            histograms = seeds = None
+
+            row = {"samples": size, "model_mb": round(os.path.getsize(model) / 2 ** 20, 1)}
+            row["full_rewrite_ms"] = timed(lambda: lbph_model.write_model(model, *lbph_model.read_model(model)))
+            lbph_model.export_binary(model)
+            row["enroll_one_user_ms"] = timed(lambda: lbph_model.add_user(model, new_faces, 10 ** 6), 3)
+            row["remove_one_user_ms"] = timed(lambda: lbph_model.remove_user(model, 1))
+            row["load_with_journal_ms"] = timed(lambda: load_matcher(model))
+            row["compact_ms"] = timed(lambda: lbph_model.compact(model, 0))
+            results.append(row)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+def bench_storage(sizes, users=500):
+    """Attendance operations against history size, plus the old full-CSV scan for reference"""
+    results = []
+    start_day = datetime(2025, 1, 1, 7, 30)
+    for size in sizes:
+        root = tempfile.mkdtemp(prefix="bench_store_")
+        try:
+            csv_path = os.path.join(root, "attendance.csv")
+            with open(csv_path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["User ID", "Name", "Time"])
+                for i in range(size):
+                    when = start_day + timedelta(days=i * 365 // max(1, size), minutes=i % 120)
+                    writer.writerow([str(i % users), f"User {i % users}", when.strftime("%Y-%m-%d %H:%M:%S")])
+
+            def csv_scan():
+                with open(csv_path, "r", newline="") as f:
+                    reader = csv.reader(f)
+                    next(reader, None)
+                    return list(reader)
+
+            row = {"rows": size, "csv_scan_ms": timed(csv_scan, 3)}
+            db = AttendanceDB(os.path.join(root, "attendance.db"))
+            row["migrate_ms"] = timed(lambda: db.migrate_csv(csv_path))
+            day = "2025-06-15"
+            row["count_day_ms"] = timed(lambda: db.count(day), 5)
+            row["page_sorted_ms"] = timed(lambda: db.rows("2025-06", sort="name", limit=100, offset=0), 5)
+            row["page_deep_ms"] = timed(lambda: db.rows("", limit=100, offset=max(0, size - 100)), 5)
+            row["attended_on_ms"] = round(timed(lambda: [db.attended_on(str(u), day) for u in range(100)]) / 100, 4)
+            row["range_summary_ms"] = timed(lambda: db.range_summary("2025-02-10", "2025-11-20"), 3)
+            stamp = "2026-01-01 08:00:00"
+            row["append_ms"] = round(timed(lambda: [db.append("bench", "Bench", stamp) for _ in range(50)]) / 50, 4)
+            row["delete_user_ms"] = timed(lambda: (db.delete_user("7"), db.export_csv(csv_path)))
+            db.close()
+            results.append(row)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+def bench_startup(runs=3, exe=None):
+    """Launch the GUI until its engine is warm, `runs` times; needs a display.
+
+    process_ms is wall time from spawn to exit, so it includes interpreter start-up and,
+    for a onefile EXE, unpacking; the other fields are the app's own --startup-report.
+    """
+    app_dir = os.path.dirname(os.path.abspath(exe or __file__))
+    command = [exe] if exe else [sys.executable, os.path.join(app_dir, "app.py")]
+    results = []
+    for _ in range(runs):
+        root = tempfile.mkdtemp(prefix="bench_startup_")
+        try:
+            report_path = os.path.join(root, "startup.json")
+            started = time.perf_counter()
+            proc = subprocess.run(command + ["--startup-report", report_path], cwd=app_dir,
+                                  capture_output=True, text=True, timeout=300)
+            process_ms = round((time.perf_counter() - started) * 1000, 1)
+            if not os.path.exists(report_path):
+                reason = (proc.stderr.strip().splitlines() or [f"exit code {proc.returncode}"])[-1]
+                return {"skipped": reason}
+            with open(report_path) as f:
+                row = json.load(f)
+            row["process_ms"] = process_ms
+            results.append(row)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+    return results
+
+
+# ------------------------------
+# Run / report
+# ------------------------------
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except Exception:
+        commit = ""
+    return {"commit": commit or None, "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(), "opencv": cv2.__version__, "numpy": np.__version__,
+            "platform": platform.platform(), "cpus": os.cpu_count()}
+
+SUITES = ("detection", "motion", "predict", "training", "enroll", "storage", "startup")
+
+BACKEND_FILES = {"haar": "haarcascade_frontalface_default.xml", "lbp": "lbpcascade_frontalface.xml",
+                 "yunet": "face_detection_yunet_2023mar.onnx"}
+
+def find_backends():
+    """Detector backends whose model file is in Resources/ (or, for the cascades, ships with OpenCV)"""
+    backends = {}
+    for name in DETECTOR_BACKENDS:
+        local = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Resources", BACKEND_FILES[name])
+        bundled = os.path.join(os.path.dirname(cv2.__file__), "data", BACKEND_FILES[name])
+        for path in (local, bundled):
+            if os.path.exists(path):
+                backends[name] = create_backend(name, path)
+                break
+    return backends
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark detection, motion gating, recognition, training, storage and start-up")
+    parser.add_argument("--only", default=",".join(SUITES), help="comma-separated subset of " + ", ".join(SUITES))
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a fast sanity run")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    parser.add_argument("--face-image", help="grayscale face crop to use instead of the synthetic face")
+    parser.add_argument("--per-user", type=int, default=2, help="samples per user in the predict benchmark")
+    parser.add_argument("--exe", help="time this packaged FaceAttendance executable in the startup suite instead of app.py")
+    args = parser.parse_args(argv)
+
+    suites = [s.strip() for s in args.only.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    if args.quick:
+        resolutions, rosters, train_sizes, store_sizes = [(640, 480)], [10, 100], [100], [1000, 10000]
+        enroll_sizes = [100, 1000]
+    else:
+        resolutions = [(320, 240), (640, 480), (1280, 720), (1920, 1080)]
+        rosters, train_sizes, store_sizes = [10, 100, 1000, 5000], [100, 500, 2000], [1000, 10000, 100000]
+        enroll_sizes = [100, 1000, 5000]
+
+    report = {"environment": environment()}
+    cv2.setRNGSeed(0)
+    if "detection" in suites:
+        backends = find_backends()
+        if backends:
+            face = cv2.imread(args.face_image, cv2.IMREAD_GRAYSCALE) if args.face_image else None
+            report["detection"] = bench_detection(backends, resolutions, face=face)
+        else:
+            report["detection"] = {"skipped": "no face detector model found in Resources/"}
+    if "motion" in suites:
+        backends = find_backends()
+        if backends:
+            face = cv2.imread(args.face_image, cv2.IMREAD_GRAYSCALE) if args.face_image else None
+            report["motion"] = bench_motion(backends, resolutions, face=face)
+        else:
+            report["motion"] = {"skipped": "no face detector model found in Resources/"}
+    if "predict" in suites:
+        report["predict"] = bench_predict(rosters, args.per_user)
+    if "training" in suites:
+        report["training"] = bench_training(train_sizes)
+    if "enroll" in suites:
+        report["enroll"] = bench_enroll(enroll_sizes)
+    if "storage" in suites:
+        report["storage"] = bench_storage(store_sizes)
+    if "startup" in suites:
+        report["startup"] = bench_startup(1 if args.quick else 3, args.exe)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
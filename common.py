@@ -0,0 +1,201 @@
+import os
+import json
+import csv
+import sys
+import threading
+from datetime import datetime, date
+
+from attendance_db import AttendanceDB
+
+# ------------------------------
+# EXE SUPPORT: resource_path()
+# ------------------------------
+def resource_path(relative_path):
+    if hasattr(sys, "_MEIPASS"):
+        return os.path.join(sys._MEIPASS, relative_path)
+    return os.path.join(os.path.abspath("."), relative_path)
+
+
+# ------------------------------
+# Paths & Ensure Folders/Files
+# ------------------------------
+data_folder = resource_path("Data")
+resource_folder = resource_path("Resources")
+
+os.makedirs(data_folder, exist_ok=True)
+os.makedirs(resource_folder, exist_ok=True)
+
+users_json = resource_path("users.json")
+admins_json = resource_path("admins.json")
+attendance_csv = resource_path("attendance.csv")
+attendance_db_path = resource_path("attendance.db")
+late_after = "09:00:00"  # First check-in of the day after this time counts as late in reports
+cascade_path = resource_path("Resources/haarcascade_frontalface_default.xml")
+model_path = resource_path("Resources/dataset_model.xml")
+sample_cache_path = resource_path("Resources/sample_cache.pkl")
+train_checkpoint_path = resource_path("Resources/train_checkpoint.pkl")  # Left by a cancelled training run
+
+# Create users.json if missing
+if not os.path.exists(users_json):
+    with open(users_json, "w") as f:
+        json.dump({}, f)
+
+# Create admins.json if missing
+if not os.path.exists(admins_json):
+    with open(admins_json, "w") as f:
+        json.dump({"admin": "1234"}, f)
+
+# Create attendance.csv if missing
+if not os.path.exists(attendance_csv):
+    with open(attendance_csv, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["User ID", "Name", "Time"])
+
+
+# ------------------------------
+# Locate Cascade (graceful if missing)
+# ------------------------------
+if not os.path.exists(cascade_path):
+    try:
+        import cv2 as _cv2
+        cascade_path = os.path.join(os.path.dirname(_cv2.__file__), "data", "haarcascade_frontalface_default.xml")
+    except Exception:
+        cascade_path = None
+
+if cascade_path is None or not os.path.exists(cascade_path):
+    message = ("haarcascade_frontalface_default.xml not found.\n"
+               "Place it in Resources/ or install opencv and/or copy the cascade file.")
+    print(message)
+
+
+# ------------------------------
+# Face detector backend
+# ------------------------------
+# "haar" (default), "lbp" (LBP cascade, several times faster) or "yunet" (ONNX CNN run by
+# cv2.dnn, most robust; drop its model file into Resources/). Override with FACE_DETECTOR.
+# Boxes differ a little between backends, so retrain the model after switching.
+detector_backend = os.environ.get("FACE_DETECTOR", "haar").strip().lower()
+detector_paths = {
+    "haar": cascade_path,
+    "lbp": resource_path("Resources/lbpcascade_frontalface.xml"),
+    "yunet": resource_path("Resources/face_detection_yunet_2023mar.onnx"),
+}
+
+def detector_spec():
+    """(backend, model path) to run: the configured backend, or Haar if its model is missing"""
+    path = detector_paths.get(detector_backend)
+    if path and os.path.exists(path):
+        return detector_backend, path
+    if detector_backend != "haar":
+        print(f"Detector '{detector_backend}' is not available; using haar")
+    return "haar", cascade_path
+
+# Live sessions run the detector only on frames with motion, plus FACE_MIN_CHECK_HZ
+# full checks a second so someone standing still is still found. FACE_MOTION_GATE=0
+# detects on every frame.
+motion_gate = os.environ.get("FACE_MOTION_GATE", "1").strip().lower() not in ("0", "false", "no", "off")
+motion_min_check_hz = float(os.environ.get("FACE_MIN_CHECK_HZ", "1"))
+
+_face_detector = None
+_face_detector_lock = threading.Lock()
+
+def face_detector():
+    """Shared raw detector for the configured backend, loaded on first use; None if none loads"""
+    global _face_detector
+    with _face_detector_lock:
+        if _face_detector is None:
+            from engine import create_backend
+            try:
+                _face_detector = create_backend(*detector_spec())
+            except Exception as e:
+                print(f"Could not load the face detector: {e}")
+        return _face_detector
+
+
+# ------------------------------
+# Helper: read users/admins/attendance
+# ------------------------------
+def load_users():
+    with open(users_json, "r") as f:
+        return json.load(f)
+
+def save_users(users_dict):
+    with open(users_json, "w") as f:
+        json.dump(users_dict, f, indent=2)
+
+def load_admins():
+    with open(admins_json, "r") as f:
+        return json.load(f)
+
+_attendance_db = None
+_attendance_db_lock = threading.Lock()
+
+def attendance_db():
+    """Shared attendance store; the first call imports any existing attendance.csv"""
+    global _attendance_db
+    with _attendance_db_lock:
+        if _attendance_db is None:
+            db = AttendanceDB(attendance_db_path, late_after)
+            migrated = db.migrate_csv(attendance_csv)
+            if migrated:
+                print(f"Imported {migrated} attendance rows from {os.path.basename(attendance_csv)}")
+            _attendance_db = db
+        return _attendance_db
+
+def attendance_page(date_filter="", sort=None, descending=False, limit=100, offset=0):
+    return attendance_db().rows(date_filter, sort, descending, limit, offset)
+
+def delete_user_attendance(user_id):
+    """Remove a user's attendance rows; attendance.csv is re-exported to stay in step"""
+    db = attendance_db()
+    deleted = db.delete_user(user_id)
+    if deleted:
+        db.export_csv(attendance_csv)
+    today_attendance.invalidate()
+    return deleted
+
+def count_attendance(date_filter=""):
+    return attendance_db().count(date_filter)
+
+def append_attendance(user_id, name):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    attendance_db().append(user_id, name, now)
+    # attendance.csv is kept as an append-only export for spreadsheets and scripts
+    with open(attendance_csv, "a", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow([user_id, name, now])
+    today_attendance.record(user_id, now)
+    return now
+
+
+# ------------------------------
+# Helper: "already attended today" index
+# ------------------------------
+class AttendanceIndex:
+    """Set of user IDs with an attendance row for the current day"""
+
+    def __init__(self):
+        self.day = None
+        self.user_ids = set()
+
+    def refresh(self):
+        # Rebuild only when the date changes (first use or midnight rollover)
+        today_str = date.today().isoformat()
+        if self.day == today_str:
+            return
+        self.user_ids = attendance_db().user_ids_on(today_str)
+        self.day = today_str
+
+    def contains(self, user_id):
+        self.refresh()
+        return str(user_id) in self.user_ids
+
+    def record(self, user_id, timestamp):
+        if self.day is not None and timestamp.startswith(self.day):
+            self.user_ids.add(str(user_id))
+
+    def invalidate(self):
+        self.day = None
+        self.user_ids = set()
+
+today_attendance = AttendanceIndex()
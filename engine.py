@@ -0,0 +1,852 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import namedtuple, Counter
+from contextlib import nullcontext
+import cv2
+import numpy as np
+
+from matcher import get_model_holder
+from preprocess import default_normalizer
+import metrics as metrics_mod
+
+
+# ------------------------------
+# Recognition events
+# ------------------------------
+RecognitionEvent = namedtuple("RecognitionEvent",
+                              "user_id name confidence bbox timestamp frame_index track_id confirmed",
+                              defaults=(None, True))
+
+
+# ------------------------------
+# Frame sources
+# ------------------------------
+DEFAULT_CAMERA_API = cv2.CAP_DSHOW if os.name == "nt" else cv2.CAP_ANY
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+class FrameSource:
+    """Iterable of BGR (or grayscale) frames; call close() when done"""
+
+    def frames(self):
+        raise NotImplementedError
+
+    def __iter__(self):
+        return self.frames()
+
+    def is_opened(self):
+        return True
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0, api=DEFAULT_CAMERA_API):
+        self.cap = cv2.VideoCapture(index, api)
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    def frames(self):
+        while True:
+            ret, frame = self.cap.read()
+            if not ret:
+                return
+            yield frame
+
+    def close(self):
+        self.cap.release()
+
+
+class VideoFileSource(CameraSource):
+    def __init__(self, path):
+        self.cap = cv2.VideoCapture(path)
+
+
+class ImageDirSource(FrameSource):
+    def __init__(self, folder):
+        self.paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder))
+                      if f.lower().endswith(IMAGE_EXTENSIONS)]
+
+    def frames(self):
+        for path in self.paths:
+            frame = cv2.imread(path)
+            if frame is None:
+                print(f"Could not read {path}")
+                continue
+            yield frame
+
+
+class GeneratorSource(FrameSource):
+    def __init__(self, iterable):
+        self.iterable = iterable
+
+    def frames(self):
+        yield from self.iterable
+
+
+def open_source(spec):
+    """Build a frame source from a camera index, video file, image folder or iterable"""
+    if isinstance(spec, FrameSource):
+        return spec
+    if isinstance(spec, int) or (isinstance(spec, str) and spec.isdigit()):
+        return CameraSource(int(spec))
+    if isinstance(spec, str):
+        if os.path.isdir(spec):
+            return ImageDirSource(spec)
+        return VideoFileSource(spec)
+    return GeneratorSource(spec)
+
+
+# ------------------------------
+# Detection strategies
+# ------------------------------
+def as_boxes(detections):
+    return [tuple(int(v) for v in box) for box in detections]
+
+
+class CascadeDetector:
+    """Full-frame detectMultiScale on a cascade, the original detection behaviour"""
+
+    def __init__(self, cascade, scale_factor=1.3, min_neighbors=5):
+        self.cascade = cascade
+        self.scale_factor = scale_factor
+        self.min_neighbors = min_neighbors
+
+    def detect(self, gray, min_size=None, max_size=None):
+        return as_boxes(self.cascade.detectMultiScale(
+            gray, self.scale_factor, self.min_neighbors,
+            minSize=min_size or (0, 0), maxSize=max_size or (0, 0)))
+
+    def reset(self):
+        pass
+
+
+class YuNetDetector:
+    """OpenCV's YuNet CNN face detector: an ONNX model run on the CPU by cv2.dnn.
+
+    Slower than the cascades on large frames but finds turned and badly lit faces they
+    miss; pair it with DownscaledDetector/RoiDetector like any other backend.
+    """
+
+    def __init__(self, model_path, score_threshold=0.8, nms_threshold=0.3, top_k=50):
+        self.net = cv2.FaceDetectorYN.create(model_path, "", (320, 320), score_threshold, nms_threshold, top_k)
+        self.input_size = None
+
+    def detect(self, gray, min_size=None, max_size=None):
+        frame_h, frame_w = gray.shape[:2]
+        if (frame_w, frame_h) != self.input_size:
+            self.net.setInputSize((frame_w, frame_h))
+            self.input_size = (frame_w, frame_h)
+        image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR) if gray.ndim == 2 else gray
+        _, faces = self.net.detect(image)
+        boxes = []
+        for row in faces if faces is not None else []:
+            x, y = max(0, int(round(row[0]))), max(0, int(round(row[1])))
+            w, h = min(frame_w - x, int(round(row[2]))), min(frame_h - y, int(round(row[3])))
+            if w <= 0 or h <= 0:
+                continue
+            if min_size and (w < min_size[0] or h < min_size[1]):
+                continue
+            if max_size and (w > max_size[0] or h > max_size[1]):
+                continue
+            boxes.append((x, y, w, h))
+        return boxes
+
+    def reset(self):
+        pass
+
+
+class DownscaledDetector:
+    """Detects on a frame resized to `target_width` and maps boxes back to full resolution"""
+
+    def __init__(self, base, target_width=640):
+        self.base = base
+        self.target_width = target_width
+
+    def detect(self, gray, min_size=None, max_size=None):
+        scale = min(1.0, self.target_width / float(gray.shape[1]))
+        if scale >= 1.0:
+            return self.base.detect(gray, min_size, max_size)
+
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        to_small = lambda size: size and (max(1, int(size[0] * scale)), max(1, int(size[1] * scale)))
+        boxes = self.base.detect(small, to_small(min_size), to_small(max_size))
+        return [tuple(int(round(v / scale)) for v in box) for box in boxes]
+
+    def reset(self):
+        self.base.reset()
+
+
+class RoiDetector:
+    """Searches only around the previous frame's faces, with a full-frame scan every
+    `full_scan_every` frames (or whenever nothing is being followed).
+
+    Full scans are limited to face sizes seen so far once enough have been observed;
+    every `open_scan_every`-th full scan is unconstrained so new distances are still found.
+    """
+
+    def __init__(self, base, full_scan_every=10, margin=0.5, size_slack=0.4,
+                 open_scan_every=4, min_observations=20):
+        self.base = base
+        self.full_scan_every = full_scan_every
+        self.margin = margin
+        self.size_slack = size_slack
+        self.open_scan_every = open_scan_every
+        self.min_observations = min_observations
+        self.reset()
+
+    def reset(self):
+        self.base.reset()
+        self.previous = []
+        self.frame_index = 0
+        self.full_scans = 0
+        self.observed_widths = []
+
+    def _observed_size_limits(self):
+        if len(self.observed_widths) < self.min_observations:
+            return None, None
+        if self.full_scans % self.open_scan_every == 0:
+            return None, None
+        lo = int(min(self.observed_widths) * (1 - self.size_slack))
+        hi = int(max(self.observed_widths) * (1 + self.size_slack))
+        return (lo, lo), (hi, hi)
+
+    def detect(self, gray, min_size=None, max_size=None):
+        full_scan = not self.previous or self.frame_index % self.full_scan_every == 0
+        self.frame_index += 1
+
+        if full_scan:
+            self.full_scans += 1
+            lo, hi = self._observed_size_limits()
+            boxes = self.base.detect(gray, min_size or lo, max_size or hi)
+        else:
+            boxes = []
+            frame_h, frame_w = gray.shape[:2]
+            for (x, y, w, h) in self.previous:
+                pad_x, pad_y = int(w * self.margin), int(h * self.margin)
+                x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+                x1, y1 = min(frame_w, x + w + pad_x), min(frame_h, y + h + pad_y)
+                lo = max(1, int(w * (1 - self.size_slack)))
+                hi = int(w * (1 + self.size_slack))
+                for (rx, ry, rw, rh) in self.base.detect(gray[y0:y1, x0:x1], (lo, lo), (hi, hi)):
+                    box = (rx + x0, ry + y0, rw, rh)
+                    if all(box_iou(box, b) < 0.5 for b in boxes):
+                        boxes.append(box)
+
+        self.previous = boxes
+        self.observed_widths = (self.observed_widths + [b[2] for b in boxes])[-200:]
+        return boxes
+
+
+class MotionGatedDetector:
+    """Skips detection on frames where nothing has changed, e.g. an empty hallway.
+
+    Each frame is compared at `analysis_width` against a slowly updated background;
+    the base detector runs when at least `min_changed` of the pixels differ by more than
+    `pixel_threshold`, for `hold_seconds` after the last such frame, and at least
+    `min_check_hz` times a second regardless (0 = only on motion). A skipped frame looks
+    like the last one checked, so it gets that frame's boxes again: someone standing
+    still stays tracked without being re-detected.
+    """
+
+    def __init__(self, base, min_check_hz=1.0, hold_seconds=1.0, pixel_threshold=25, min_changed=0.002,
+                 analysis_width=160, learning_rate=0.1, metrics=None, clock=time.monotonic):
+        self.base = base
+        self.min_check_hz = min_check_hz
+        self.hold_seconds = hold_seconds
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.analysis_width = analysis_width
+        self.learning_rate = learning_rate
+        self.metrics = metrics or metrics_mod.DISABLED
+        self.clock = clock
+        self.reset()
+
+    def reset(self):
+        self.base.reset()
+        self.background = None
+        self.previous = []
+        self.last_check = None
+        self.last_motion = None
+        self.checks = 0
+        self.skipped = 0
+
+    def changed_fraction(self, gray):
+        """Share of pixels that differ from the background; also updates the background"""
+        scale = min(1.0, self.analysis_width / float(gray.shape[1]))
+        small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_NEAREST)
+        small = cv2.GaussianBlur(small, (5, 5), 0)  # Sensor noise must not count as motion
+        if self.background is None or self.background.shape != small.shape:
+            self.background = small.astype(np.float32)
+            return 0.0  # Nothing to compare with; the first frame is checked anyway
+        diff = cv2.absdiff(small, cv2.convertScaleAbs(self.background))
+        cv2.accumulateWeighted(small, self.background, self.learning_rate)
+        return cv2.countNonZero(cv2.threshold(diff, self.pixel_threshold, 255, cv2.THRESH_BINARY)[1]) / diff.size
+
+    def detect(self, gray, min_size=None, max_size=None):
+        now = self.clock()
+        with self.metrics.time("motion"):
+            moved = self.changed_fraction(gray) >= self.min_changed
+        if moved:
+            self.last_motion = now
+        due = self.last_check is None or (
+            self.min_check_hz > 0 and now - self.last_check >= 1.0 / self.min_check_hz)
+        holding = self.last_motion is not None and now - self.last_motion < self.hold_seconds
+        if not (due or holding):
+            self.skipped += 1
+            self.metrics.tick("detect_skipped")
+            return list(self.previous)
+        self.last_check = now
+        self.checks += 1
+        self.previous = self.base.detect(gray, min_size, max_size)
+        return self.previous
+
+
+def evaluate_detectors(frames, detectors, reference=None, iou_threshold=0.5, truth=None):
+    """Time each detection strategy over the same frames and measure recall.
+
+    `detectors` maps a name to a strategy; recall is measured against `truth` (known
+    face boxes per frame) or else against `reference` (defaults to the first strategy),
+    matching boxes by IoU.
+    Returns {name: {"ms_per_frame", "fps", "faces", "recall"}}.
+    """
+    grays = [cv2.cvtColor(f, cv2.COLOR_BGR2GRAY) if f.ndim == 3 else f for f in frames]
+    if truth is not None:
+        expected = [list(boxes) for boxes in truth]
+    else:
+        reference = reference or next(iter(detectors.values()))
+        reference.reset()
+        expected = [reference.detect(g) for g in grays]
+    total_expected = sum(len(b) for b in expected)
+
+    report = {}
+    for name, detector in detectors.items():
+        detector.reset()
+        found, hits = 0, 0
+        started = time.perf_counter()
+        results = [detector.detect(g) for g in grays]
+        elapsed = time.perf_counter() - started
+        for boxes, truth in zip(results, expected):
+            found += len(boxes)
+            hits += sum(1 for t in truth if any(box_iou(t, b) >= iou_threshold for b in boxes))
+        report[name] = {
+            "ms_per_frame": 1000.0 * elapsed / max(1, len(grays)),
+            "fps": len(grays) / elapsed if elapsed else 0.0,
+            "faces": found,
+            "recall": hits / total_expected if total_expected else 1.0,
+        }
+    return report
+
+
+def as_detector(detector, scale_factor=1.3, min_neighbors=5):
+    """A raw CascadeClassifier becomes a CascadeDetector; detectors are returned unchanged"""
+    if hasattr(detector, "detectMultiScale"):
+        return CascadeDetector(detector, scale_factor, min_neighbors)
+    return detector
+
+
+def default_detector(detector, scale_factor=1.3, min_neighbors=5):
+    """Downscale large frames and follow known faces, with periodic full scans"""
+    return RoiDetector(DownscaledDetector(as_detector(detector, scale_factor, min_neighbors)))
+
+
+def motion_gated(detector, min_check_hz=1.0, metrics=None):
+    """default_detector() behind a MotionGatedDetector, for cameras that are idle most of the day"""
+    return MotionGatedDetector(default_detector(detector), min_check_hz, metrics=metrics)
+
+
+def detector_strategies(detector):
+    base = as_detector(detector)
+    return {
+        "full": base,
+        "downscaled": DownscaledDetector(base),
+        "roi": RoiDetector(base),
+        "downscaled+roi": default_detector(base),
+    }
+
+
+# ------------------------------
+# Detector backends
+# ------------------------------
+DETECTOR_BACKENDS = ("haar", "lbp", "yunet")
+
+def create_backend(name, path):
+    """Raw detector for a backend: "haar" / "lbp" read a cascade XML, "yunet" an ONNX model"""
+    if name not in DETECTOR_BACKENDS:
+        raise ValueError(f"unknown detector backend {name!r} (choose from {', '.join(DETECTOR_BACKENDS)})")
+    if not path or not os.path.exists(path):
+        raise FileNotFoundError(f"{name} detector model not found: {path}")
+    if name == "yunet":
+        return YuNetDetector(path)
+    cascade = cv2.CascadeClassifier(path)
+    if cascade.empty():
+        raise ValueError(f"could not load cascade {path}")
+    return CascadeDetector(cascade)
+
+
+def backend_strategies(backends):
+    """Every strategy of every backend, named "<backend>/<strategy>"; backends maps name -> detector"""
+    return {f"{backend}/{strategy}": detector
+            for backend, base in backends.items()
+            for strategy, detector in detector_strategies(base).items()}
+
+
+def cheapest_detector(report, min_recall):
+    """Name of the fastest entry of an evaluate_detectors() report with at least `min_recall`, or None"""
+    good = [(r["ms_per_frame"], name) for name, r in report.items() if r["recall"] >= min_recall]
+    return min(good)[1] if good else None
+
+
+# ------------------------------
+# Face tracking (recognize once per person, not once per frame)
+# ------------------------------
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+def centroid_distance(a, b):
+    return np.hypot((a[0] + a[2] / 2) - (b[0] + b[2] / 2), (a[1] + a[3] / 2) - (b[1] + b[3] / 2))
+
+
+class Track:
+    def __init__(self, track_id, bbox):
+        self.track_id = track_id
+        self.bbox = bbox
+        self.missed = 0
+        self.age = 0
+        self.votes = Counter()
+        self.conf_sum = Counter()
+        self.user_id = None
+        self.confidence = 0.0
+        self.confirmed = False
+        self.last_predicted = 0
+
+    def add_vote(self, user_id, conf, votes_needed):
+        self.votes[user_id] += 1
+        self.conf_sum[user_id] += conf
+        self.user_id, count = self.votes.most_common(1)[0]
+        self.confidence = self.conf_sum[self.user_id] / count
+        self.confirmed = count >= votes_needed
+        self.last_predicted = self.age
+
+    def reset_votes(self):
+        self.votes.clear()
+        self.conf_sum.clear()
+        self.confirmed = False
+
+
+class FaceTracker:
+    """Matches detections to tracks by IoU (centroid distance as a fallback for fast motion).
+
+    A track is predicted on every frame until one identity has `votes_needed` votes, then it
+    keeps that identity and is only re-checked every `recheck_every` frames.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=5, votes_needed=3, recheck_every=30):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.votes_needed = votes_needed
+        self.recheck_every = recheck_every
+        self.tracks = []
+        self.next_id = 1
+
+    def update(self, boxes):
+        """Assign detections to tracks; returns the tracks seen in this frame, in box order"""
+        boxes = [tuple(int(v) for v in b) for b in boxes]
+        pairs = []
+        for ti, track in enumerate(self.tracks):
+            for bi, box in enumerate(boxes):
+                iou = box_iou(track.bbox, box)
+                if iou >= self.iou_threshold:
+                    pairs.append((iou, ti, bi))
+                elif centroid_distance(track.bbox, box) < 0.5 * max(track.bbox[2], box[2]):
+                    pairs.append((0.0, ti, bi))
+        pairs.sort(reverse=True)
+
+        matched_tracks, assigned = set(), {}
+        for _, ti, bi in pairs:
+            if ti in matched_tracks or bi in assigned:
+                continue
+            matched_tracks.add(ti)
+            assigned[bi] = self.tracks[ti]
+
+        for ti, track in enumerate(self.tracks):
+            track.age += 1
+            if ti not in matched_tracks:
+                track.missed += 1
+        self.tracks = [t for t in self.tracks if t.missed <= self.max_missed]
+
+        seen = []
+        for bi, box in enumerate(boxes):
+            track = assigned.get(bi)
+            if track is None:
+                track = Track(self.next_id, box)
+                self.next_id += 1
+                self.tracks.append(track)
+            track.bbox = box
+            track.missed = 0
+            seen.append(track)
+        return seen
+
+    def needs_prediction(self, track):
+        if not track.confirmed:
+            return True
+        return bool(self.recheck_every) and track.age - track.last_predicted >= self.recheck_every
+
+    def add_prediction(self, track, user_id, conf):
+        if track.confirmed and user_id != track.user_id:
+            track.reset_votes()  # Identity changed under the track (e.g. people swapped)
+        track.add_vote(user_id, conf, self.votes_needed)
+
+
+# ------------------------------
+# Recognition engine (no windows, no dialogs)
+# ------------------------------
+class RecognitionEngine:
+    """Detects and identifies faces in frames and reports them as RecognitionEvents"""
+
+    def __init__(self, cascade, recognizer=None, users=None, scale_factor=1.3, min_neighbors=5,
+                 tracker=None, detector=None, model=None, metrics=None, normalizer=None):
+        self.cascade = cascade
+        self.metrics = metrics or metrics_mod.DISABLED
+        # With a ModelHolder, the recognizer and users are refreshed every frame (hot reload)
+        self.model = model
+        if model is not None:
+            recognizer, users = model.current()
+        self.recognizer = recognizer
+        self.users = users
+        self.detector = detector or as_detector(cascade, scale_factor, min_neighbors)
+        self.tracker = tracker
+        # Faces must be normalized exactly like the training samples were
+        self.normalizer = normalizer or default_normalizer()
+        self.frame_count = 0
+        self.predict_count = 0
+        self.busy_time = 0.0
+
+    def detect(self, gray):
+        return self.detector.detect(gray)
+
+    def process(self, frame, frame_index=0, timestamp=None):
+        """Recognize every face in one frame; returns a list of RecognitionEvents"""
+        m = self.metrics
+        started = time.perf_counter()
+        timestamp = time.time() if timestamp is None else timestamp
+        with m.time("convert"):
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        if self.model is not None:
+            self.recognizer, self.users = self.model.current()
+
+        events = []
+        with m.time("detect"):
+            boxes = self.detect(gray)
+        crop = lambda b: self.normalizer(gray[b[1]:b[1]+b[3], b[0]:b[0]+b[2]])
+        if self.tracker is None:
+            with m.time("predict"):
+                predictions = self.predict_many([crop(b) for b in boxes])
+            for box, (user_id, conf) in zip(boxes, predictions):
+                events.append(self._event(user_id, conf, box, timestamp, frame_index))
+        else:
+            with m.time("track"):
+                tracks = self.tracker.update(boxes)
+                pending = [t for t in tracks if self.tracker.needs_prediction(t)]
+            if pending:
+                with m.time("predict"):
+                    predictions = self.predict_many([crop(t.bbox) for t in pending])
+                for track, (user_id, conf) in zip(pending, predictions):
+                    self.tracker.add_prediction(track, user_id, conf)
+            for track in tracks:
+                events.append(self._event(track.user_id, track.confidence, track.bbox, timestamp,
+                                          frame_index, track.track_id, track.confirmed))
+
+        self.frame_count += 1
+        elapsed = time.perf_counter() - started
+        self.busy_time += elapsed
+        m.observe("process", elapsed)
+        m.tick("processed")
+        return events
+
+    def predict(self, face):
+        self.predict_count += 1
+        return self.recognizer.predict(face)
+
+    def predict_many(self, faces):
+        """Predict all faces of a frame, in one batch when the recognizer supports it"""
+        if len(faces) > 1 and hasattr(self.recognizer, "predict_batch"):
+            self.predict_count += len(faces)
+            return self.recognizer.predict_batch(faces)
+        return [self.predict(face) for face in faces]
+
+    def _event(self, user_id, conf, bbox, timestamp, frame_index, track_id=None, confirmed=True):
+        name = self.users.get(str(user_id), "Unknown")
+        return RecognitionEvent(int(user_id), name, float(conf), tuple(int(v) for v in bbox),
+                                timestamp, frame_index, track_id, confirmed)
+
+    def run(self, source):
+        """Yield (frame, events) for every frame of a source"""
+        frames = iter(open_source(source))
+        frame_index = 0
+        while True:
+            with self.metrics.time("capture"):
+                frame = next(frames, None)
+            if frame is None:
+                return
+            yield frame, self.process(frame, frame_index)
+            frame_index += 1
+
+    def run_threaded(self, source):
+        """Pipelined variant of run(): returns a ThreadedPipeline to iterate and stop()"""
+        return ThreadedPipeline(self, source)
+
+    def fps(self):
+        return self.frame_count / self.busy_time if self.busy_time else 0.0
+
+
+# ------------------------------
+# Threaded capture / recognize pipeline
+# ------------------------------
+class LatestSlot:
+    """Single-item mailbox: put() replaces any unread item, so readers only see the newest"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.item = None
+        self.seq = 0
+        self.read_seq = 0
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, item):
+        with self.cond:
+            if self.seq > self.read_seq:
+                self.dropped += 1  # Previous item was never consumed
+            self.item = item
+            self.seq += 1
+            self.cond.notify_all()
+
+    def get(self, timeout=None):
+        """Wait for an item newer than the last one read; returns None once closed"""
+        with self.cond:
+            self.cond.wait_for(lambda: self.seq > self.read_seq or self.closed, timeout)
+            if self.seq == self.read_seq:
+                return None
+            self.read_seq = self.seq
+            return self.item
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class ThreadedPipeline:
+    """Capture thread -> recognition thread -> caller, dropping stale frames at each hand-off.
+
+    The capture thread keeps draining the source so the camera buffer never backs up, and
+    the worker always picks the newest frame, so display latency stays within one
+    detection cycle instead of growing with a queue. Meant for live cameras: a video
+    file is read as fast as possible, so most of its frames are skipped.
+    """
+
+    def __init__(self, engine, source):
+        self.engine = engine
+        self.source = open_source(source)
+        self.frames = LatestSlot()
+        self.results = LatestSlot()
+        self.stop_event = threading.Event()
+        self.threads = [threading.Thread(target=self._capture, daemon=True),
+                        threading.Thread(target=self._recognize, daemon=True)]
+        self.started = False
+        self.last_latency = 0.0
+
+    def _capture(self):
+        m = self.engine.metrics
+        frames = iter(self.source)
+        try:
+            while not self.stop_event.is_set():
+                with m.time("capture"):
+                    frame = next(frames, None)
+                if frame is None:
+                    break
+                m.tick("captured")
+                self.frames.put((time.perf_counter(), frame))
+        finally:
+            self.frames.close()
+
+    def _recognize(self):
+        frame_index = 0
+        try:
+            with self.engine.metrics.profiled():
+                while not self.stop_event.is_set():
+                    item = self.frames.get()
+                    if item is None:
+                        break
+                    captured_at, frame = item
+                    events = self.engine.process(frame, frame_index)
+                    self.results.put((captured_at, frame, events))
+                    frame_index += 1
+        finally:
+            self.results.close()
+
+    def start(self):
+        if not self.started:
+            self.started = True
+            for thread in self.threads:
+                thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        self.frames.close()
+        self.results.close()
+        for thread in self.threads:
+            thread.join(timeout=2)
+        self.source.close()
+
+    def dropped_frames(self):
+        return self.frames.dropped + self.results.dropped
+
+    def __iter__(self):
+        """Yield the newest (frame, events) result each time one is ready"""
+        self.start()
+        while True:
+            item = self.results.get()
+            if item is None:
+                return
+            captured_at, frame, events = item
+            self.last_latency = time.perf_counter() - captured_at
+            self.engine.metrics.observe("latency", self.last_latency)
+            yield frame, events
+
+
+# ------------------------------
+# Headless command line
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run face recognition without the GUI")
+    parser.add_argument("--source", default="0", help="camera index, video file or image folder")
+    parser.add_argument("--max-frames", type=int, default=0, help="stop after N frames (0 = all)")
+    parser.add_argument("--record", action="store_true", help="write attendance for recognized users")
+    parser.add_argument("--detector", default="full", choices=["full", "downscaled", "roi", "downscaled+roi"],
+                        help="face detection strategy")
+    parser.add_argument("--backend", choices=DETECTOR_BACKENDS,
+                        help="face detector backend (default: FACE_DETECTOR or haar)")
+    parser.add_argument("--compare-detectors", action="store_true",
+                        help="report speed and recall of every backend and strategy on the source")
+    parser.add_argument("--reference", help='detector recall is measured against in --compare-detectors, '
+                                            'e.g. "haar/full" (default: yunet/full if available, else haar/full)')
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="--compare-detectors recommends the fastest detector with at least this recall")
+    parser.add_argument("--motion-gate", type=float, metavar="HZ",
+                        help="detect only on frames with motion, and at least HZ times a second")
+    parser.add_argument("--no-tracking", action="store_true",
+                        help="predict every face on every frame instead of once per track")
+    parser.add_argument("--prune", type=int, default=0,
+                        help="compare only the N closest users' samples on rosters of 500+ users (0 = off)")
+    parser.add_argument("--threaded", action="store_true",
+                        help="capture and recognize on separate threads, dropping stale frames")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="record per-stage timings; written to FILE (.prom/.txt = Prometheus text, else JSON)")
+    parser.add_argument("--profile", metavar="FILE", help="cProfile the session and write the stats to FILE")
+    args = parser.parse_args(argv)
+
+    import common
+
+    if args.compare_detectors:
+        backends = {}
+        for name in DETECTOR_BACKENDS:
+            try:
+                backends[name] = create_backend(name, common.detector_paths.get(name))
+            except Exception as e:
+                print(f"Skipping {name}: {e}", file=sys.stderr)
+        if not backends:
+            print("No face detector found.", file=sys.stderr)
+            return 1
+        strategies = backend_strategies(backends)
+        reference = args.reference or ("yunet/full" if "yunet" in backends else next(iter(strategies)))
+        if reference not in strategies:
+            print(f"Unknown reference {reference}; choose from {', '.join(strategies)}", file=sys.stderr)
+            return 1
+        with open_source(args.source) as source:
+            frames = []
+            for frame in source:
+                frames.append(frame)
+                if args.max_frames and len(frames) >= args.max_frames:
+                    break
+        report = evaluate_detectors(frames, strategies, reference=strategies[reference])
+        print(json.dumps({"reference": reference, "detectors": report,
+                          "recommended": cheapest_detector(report, args.min_recall)}, indent=2))
+        return 0
+
+    if args.backend:
+        common.detector_backend = args.backend
+    detector = common.face_detector()
+    if detector is None:
+        print("Face detector not found.", file=sys.stderr)
+        return 1
+    strategies = detector_strategies(detector)
+
+    if not os.path.exists(common.model_path):
+        print("Model not trained yet.", file=sys.stderr)
+        return 1
+
+    model = get_model_holder(common.model_path, common.load_users, common.users_json,
+                             candidates=args.prune or None)
+    tracker = None if args.no_tracking else FaceTracker()
+    stats = metrics_mod.Metrics(dump_path=args.metrics, profile_path=args.profile)
+    detector = strategies[args.detector]
+    if args.motion_gate is not None:
+        detector = MotionGatedDetector(detector, args.motion_gate, metrics=stats)
+    engine = RecognitionEngine(None, model=model, tracker=tracker, detector=detector, metrics=stats)
+
+    with open_source(args.source) as source:
+        if not source.is_opened():
+            print(f"Cannot open source {args.source}", file=sys.stderr)
+            return 1
+        results = engine.run_threaded(source) if args.threaded else engine.run(source)
+        started = time.perf_counter()
+        # The threaded pipeline profiles its recognition thread; profile this one otherwise
+        with nullcontext() if args.threaded else stats.profiled():
+            for frame, events in results:
+                for event in events:
+                    if (args.record and event.confirmed and event.name != "Unknown"
+                            and not common.today_attendance.contains(event.user_id)):
+                        with stats.time("record"):
+                            common.append_attendance(event.user_id, event.name)
+                    print(json.dumps(event._asdict()))
+                stats.maybe_dump()
+                if args.max_frames and engine.frame_count >= args.max_frames:
+                    break
+        wall = time.perf_counter() - started
+        if args.threaded:
+            results.stop()
+            print(f"{results.dropped_frames()} stale frames dropped", file=sys.stderr)
+
+    print(f"{engine.frame_count} frames in {wall:.2f}s "
+          f"({engine.frame_count / wall if wall else 0:.1f} fps wall, {engine.fps():.1f} fps engine, "
+          f"{engine.predict_count} predictions)", file=sys.stderr)
+    if args.motion_gate is not None:
+        print(f"Detection ran on {detector.checks} frames, skipped on {detector.skipped} without motion",
+              file=sys.stderr)
+    stats.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+import time
+import queue
+import threading
+
+
+# ------------------------------
+# Progress / ETA
+# ------------------------------
+class Cancelled(Exception):
+    """Raised inside a job once cancel() was requested"""
+
+
+class EtaEstimator:
+    """Remaining time from a smoothed processing rate.
+
+    Only work done during this run counts toward the rate, so a resumed job that starts
+    at 60% does not report an absurdly fast speed.
+    """
+
+    def __init__(self, smoothing=0.3):
+        self.smoothing = smoothing
+        self.rate = None
+        self.last = None
+
+    def update(self, done, total, now=None):
+        now = time.monotonic() if now is None else now
+        if self.last is not None:
+            last_time, last_done = self.last
+            elapsed, advanced = now - last_time, done - last_done
+            if elapsed > 0 and advanced > 0:
+                rate = advanced / elapsed
+                self.rate = rate if self.rate is None else (
+                    self.smoothing * rate + (1 - self.smoothing) * self.rate)
+                self.last = (now, done)
+        else:
+            self.last = (now, done)
+        if not self.rate or total <= done:
+            return None
+        return (total - done) / self.rate
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "estimating..."
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds}s left"
+    minutes, seconds = divmod(seconds, 60)
+    if minutes < 60:
+        return f"{minutes}m {seconds:02d}s left"
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes:02d}m left"
+
+
+# ------------------------------
+# Background job runner (Tk-safe)
+# ------------------------------
+class JobContext:
+    """Handed to the job function; the only way it talks to the GUI"""
+
+    def __init__(self, job):
+        self._job = job
+
+    @property
+    def cancelled(self):
+        return self._job.cancel_event.is_set()
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled()
+
+    def progress(self, done, total, message=""):
+        # Stamped here: several events may be drained by one poll, long after they happened
+        self._job.events.put(("progress", (done, total, message, time.monotonic())))
+
+
+class BackgroundJob:
+    """Runs target(ctx) on a worker thread and delivers its events on the Tk thread.
+
+    The worker never touches widgets: it queues events, and a Tk after() poll hands them
+    to the callbacks. on_progress gets (done, total, message, eta_seconds).
+    """
+
+    def __init__(self, root, target, on_progress=None, on_done=None, on_error=None, on_cancel=None,
+                 poll_ms=100, name="job"):
+        self.root = root
+        self.target = target
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.poll_ms = poll_ms
+        self.events = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.eta = EtaEstimator()
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        self.root.after(self.poll_ms, self._poll)
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self):
+        try:
+            result = self.target(JobContext(self))
+        except Cancelled:
+            self.events.put(("cancelled", None))
+        except Exception as e:
+            self.events.put(("error", e))
+        else:
+            # A job that returns normally finished its work, even if cancel() came too late
+            self.events.put(("done", result))
+
+    def _poll(self):
+        try:
+            while True:
+                kind, payload = self.events.get_nowait()
+                if kind == "progress":
+                    done, total, message, stamp = payload
+                    eta = self.eta.update(done, total, stamp)
+                    if self.on_progress:
+                        self.on_progress(done, total, message, eta)
+                else:
+                    callback = {"done": self.on_done, "error": self.on_error,
+                                "cancelled": self.on_cancel}[kind]
+                    if callback:
+                        callback(payload) if kind != "cancelled" else callback()
+                    elif kind == "error":
+                        print(f"Background job failed: {payload}")
+                    return
+        except queue.Empty:
+            pass
+        self.root.after(self.poll_ms, self._poll)
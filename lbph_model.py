@@ -0,0 +1,428 @@
+import os
+import re
+import json
+import struct
+import tempfile
+import cv2
+import numpy as np
+
+
+# ------------------------------
+# LBPH model file (cv2.face XML) read/write
+# ------------------------------
+MODEL_NODE = "opencv_lbphfaces"
+DEFAULT_PARAMS = {"threshold": float(np.finfo(np.float64).max), "radius": 1,
+                  "neighbors": 8, "grid_x": 8, "grid_y": 8}
+
+
+def read_model(path):
+    """Read an LBPH model file into (params, histograms, labels) arrays"""
+    fs = cv2.FileStorage(path, cv2.FILE_STORAGE_READ)
+    try:
+        node = fs.getNode(MODEL_NODE)
+        if node.empty():
+            raise ValueError(f"{path} is not an LBPH model file")
+        params = {}
+        for key, default in DEFAULT_PARAMS.items():
+            value = node.getNode(key)
+            params[key] = type(default)(value.real()) if not value.empty() else default
+
+        hist_node = node.getNode("histograms")
+        histograms = [hist_node.at(i).mat().reshape(-1) for i in range(hist_node.size())]
+        labels_mat = node.getNode("labels").mat()
+    finally:
+        fs.release()
+
+    if histograms:
+        histograms = np.vstack(histograms).astype(np.float32, copy=False)
+    else:
+        histograms = np.zeros((0, 0), np.float32)
+    labels = (labels_mat.reshape(-1).astype(np.int32) if labels_mat is not None
+              else np.zeros(0, np.int32))
+    return params, histograms, labels
+
+
+def temp_path_for(path):
+    """A new temp file next to `path`, unique per writer so concurrent writers never share one"""
+    # cv2 picks the storage format from the extension, so keep it on the temp file
+    root, ext = os.path.splitext(os.path.basename(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{root}.tmp-", suffix=ext, dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    return tmp_path
+
+def publish(tmp_path, path):
+    """Rename a finished temp file over `path`; the temp file is removed if that fails"""
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+
+def discard(tmp_path):
+    try:
+        os.remove(tmp_path)
+    except OSError:
+        pass
+
+def save_recognizer(recognizer, path):
+    """recognizer.save() via temp file + rename so readers never see a half-written model"""
+    tmp_path = temp_path_for(path)
+    try:
+        recognizer.save(tmp_path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    publish(tmp_path, path)
+
+def write_model(path, params, histograms, labels):
+    """Write histograms/labels in the format LBPHFaceRecognizer.read() expects"""
+    tmp_path = temp_path_for(path)
+    fs = cv2.FileStorage(tmp_path, cv2.FILE_STORAGE_WRITE)
+    try:
+        fs.startWriteStruct(MODEL_NODE, cv2.FileNode_MAP)
+        fs.write("threshold", float(params["threshold"]))
+        for key in ("radius", "neighbors", "grid_x", "grid_y"):
+            fs.write(key, int(params[key]))
+        fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+        for h in histograms:
+            fs.write("", np.ascontiguousarray(h, np.float32).reshape(1, -1))
+        fs.endWriteStruct()
+        fs.write("labels", np.asarray(labels, np.int32).reshape(-1, 1))
+        fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+        fs.endWriteStruct()
+        fs.endWriteStruct()
+    except BaseException:
+        fs.release()
+        discard(tmp_path)
+        raise
+    fs.release()
+    publish(tmp_path, path)
+
+
+# ------------------------------
+# Incremental enrollment / removal
+# ------------------------------
+def add_user(path, faces, label, histograms=None):
+    """Merge one user's face samples into the saved model without retraining others.
+
+    The samples are appended to the model's journal, so the cost does not grow with the
+    model; an existing entry for the label is replaced. Pass `histograms` when the caller
+    already computed them for `faces` (with the model's parameters). Returns the number
+    of samples added.
+    """
+    if not len(faces):
+        return 0
+    exists = os.path.exists(path)
+    if histograms is None:
+        from matcher import face_histograms
+        histograms = face_histograms(faces, model_params(path) if exists else DEFAULT_PARAMS)
+    if exists:
+        append_journal(journal_path_for(path), label, histograms)
+    else:
+        write_model(path, DEFAULT_PARAMS, histograms, np.full(len(histograms), int(label), np.int32))
+    return len(histograms)
+
+
+def remove_user(path, label):
+    """Drop a user's histograms from the saved model; returns the number removed"""
+    if not os.path.exists(path):
+        return 0
+    labels = current_labels(path)
+    removed = int(np.count_nonzero(labels == int(label)))
+    if removed and removed == len(labels):
+        # An LBPH model cannot be empty; the next enrollment trains a fresh one
+        os.remove(path)
+        remove_stale_binaries(path)
+    elif removed:
+        append_journal(journal_path_for(path), label, None)
+    return removed
+
+
+def compact(path, min_fraction=None):
+    """Fold the journal into the model file and its binary twin; returns True if it did.
+
+    Skipped while the journal is smaller than `min_fraction` (default COMPACT_FRACTION)
+    of the model file, so the full rewrite is paid once per that much enrollment.
+    """
+    min_fraction = COMPACT_FRACTION if min_fraction is None else min_fraction
+    journal = journal_path_for(path)
+    if not os.path.exists(journal) or os.path.getsize(journal) < min_fraction * os.path.getsize(path):
+        return False
+    changes = read_journal(journal)
+    if not changes:
+        return False
+    params, histograms, labels = read_current_model(path, changes)
+    write_model(path, params, histograms, labels)
+    write_binary_model(binary_path_for(path), params, histograms, labels)
+    remove_stale_binaries(path, binary_path_for(path))
+    return True
+
+
+# ------------------------------
+# Compact binary model (memory-mappable)
+# ------------------------------
+BINARY_MAGIC = b"LBPHBIN2"
+BINARY_HEADER_SIZE = 4096
+BINARY_ALIGN = 64
+
+def binary_path_for(xml_path):
+    """Binary twin of the model file's current version: <name>.<mtime_ns>-<size>.lbph in hex.
+
+    A retrained model gets a new file instead of replacing one that readers have
+    memory-mapped, which Windows does not allow.
+    """
+    st = os.stat(xml_path)
+    return f"{os.path.splitext(xml_path)[0]}.{st.st_mtime_ns:x}-{st.st_size:x}.lbph"
+
+def _binary_version(path, xml_path):
+    """The mtime_ns a twin or journal was made for, -1 for the old unversioned twin name,
+    None for other files"""
+    root = os.path.basename(os.path.splitext(xml_path)[0])
+    name = os.path.basename(path)
+    if name == root + ".lbph":
+        return -1
+    match = re.fullmatch(re.escape(root) + r"\.([0-9a-f]+)-[0-9a-f]+\.(lbph|journal)", name)
+    return int(match.group(1), 16) if match else None
+
+def remove_stale_binaries(xml_path, keep=None):
+    """Delete twins and journals older than `keep` (all of them when keep is None); returns
+    the number deleted.
+
+    Files another process still has mapped cannot be deleted on Windows; they are left
+    for a later cleanup.
+    """
+    folder = os.path.dirname(xml_path) or "."
+    newest = _binary_version(keep, xml_path) if keep else None
+    removed = 0
+    for name in os.listdir(folder):
+        path = os.path.join(folder, name)
+        version = _binary_version(path, xml_path)
+        if version is None or (newest is not None and version >= newest):
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+def prepare_arrays(histograms, labels, dtype=np.float32):
+    """Matcher-ready arrays: samples grouped by label, one row per sample, plus the
+    square-rooted histograms the matcher bounds distances with and their per-user means"""
+    histograms = np.asarray(histograms, np.float32)
+    labels = np.asarray(labels, np.int32)
+    order = np.argsort(labels, kind="stable").astype(np.int32)
+    histograms = histograms[order]
+    sorted_labels = labels[order]
+    sqrt_hist = np.sqrt(histograms)
+
+    _, starts, counts = np.unique(sorted_labels, return_index=True, return_counts=True)
+    sqrt_centroids = (np.vstack([sqrt_hist[s:s + n].mean(axis=0) for s, n in zip(starts, counts)])
+                      if len(labels) else np.zeros((0, histograms.shape[1] if histograms.ndim == 2 else 0),
+                                                   np.float32))
+    return {
+        "hist": np.ascontiguousarray(histograms, dtype),
+        "sqrt_hist": np.ascontiguousarray(sqrt_hist, dtype),
+        "labels": sorted_labels,
+        "order": order,
+        "row_sums": histograms.sum(axis=1, dtype=np.float64),
+        "sqrt_centroids": np.ascontiguousarray(sqrt_centroids, np.float32),
+    }
+
+def write_binary_model(path, params, histograms, labels, dtype=np.float32):
+    """Write histograms/labels as raw arrays behind a small JSON header.
+
+    `dtype` may be float16 to halve the file; predictions are then approximate.
+    """
+    arrays = prepare_arrays(histograms, labels, dtype)
+    sections, offset = {}, BINARY_HEADER_SIZE
+    for name, array in arrays.items():
+        sections[name] = {"offset": offset, "dtype": array.dtype.str, "shape": list(array.shape)}
+        offset += -(-array.nbytes // BINARY_ALIGN) * BINARY_ALIGN
+
+    header = json.dumps({"params": params, "sections": sections}).encode("utf-8")
+    if len(BINARY_MAGIC) + 4 + len(header) > BINARY_HEADER_SIZE:
+        raise ValueError("Binary model header too large")
+
+    tmp_path = temp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(BINARY_MAGIC + struct.pack("<I", len(header)) + header)
+            for name, array in arrays.items():
+                f.seek(sections[name]["offset"])
+                f.write(array.tobytes())
+            f.truncate(offset)
+    except BaseException:
+        discard(tmp_path)
+        raise
+    publish(tmp_path, path)
+
+def _binary_header(path):
+    with open(path, "rb") as f:
+        head = f.read(BINARY_HEADER_SIZE)
+    if not head.startswith(BINARY_MAGIC):
+        raise ValueError(f"{path} is not a binary LBPH model")
+    (length,) = struct.unpack("<I", head[len(BINARY_MAGIC):len(BINARY_MAGIC) + 4])
+    return json.loads(head[len(BINARY_MAGIC) + 4:len(BINARY_MAGIC) + 4 + length])
+
+def read_binary_model(path, mmap=True):
+    """Open a binary model; arrays are np.memmap views unless mmap=False.
+
+    Returns (params, arrays) where arrays are the prepare_arrays() fields.
+    """
+    header = _binary_header(path)
+    arrays = {}
+    for name, section in header["sections"].items():
+        shape = tuple(section["shape"])
+        dtype = np.dtype(section["dtype"])
+        if mmap and all(shape):
+            arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=section["offset"], shape=shape)
+        else:
+            with open(path, "rb") as f:
+                f.seek(section["offset"])
+                count = int(np.prod(shape))
+                arrays[name] = np.fromfile(f, dtype=dtype, count=count).reshape(shape)
+    return header["params"], arrays
+
+def export_binary(xml_path, bin_path=None, dtype=np.float32):
+    """Convert a cv2 XML model to the binary format; returns the binary's path.
+
+    The default twin of the XML's current version is only written once: it may
+    already be mapped by a reader, and it cannot be replaced then.
+    """
+    if bin_path is None:
+        bin_path = binary_path_for(xml_path)
+        if os.path.exists(bin_path) and np.dtype(dtype) == np.float32:
+            return bin_path
+    params, histograms, labels = read_model(xml_path)
+    write_binary_model(bin_path, params, histograms, labels, dtype)
+    return bin_path
+
+def read_binary_histograms(bin_path):
+    """(params, histograms, labels) of a binary model, in the original training order"""
+    params, arrays = read_binary_model(bin_path)
+    histograms = np.empty(arrays["hist"].shape, np.float32)
+    histograms[arrays["order"]] = arrays["hist"]
+    labels = np.empty(arrays["labels"].shape, np.int32)
+    labels[arrays["order"]] = arrays["labels"]
+    return params, histograms, labels
+
+def import_binary(bin_path, xml_path):
+    """Convert a binary model back to a cv2 XML model readable by LBPHFaceRecognizer"""
+    write_model(xml_path, *read_binary_histograms(bin_path))
+
+def model_params(xml_path):
+    """The model's parameters, from the binary twin's header when there is one (no XML parse)"""
+    try:
+        return _binary_header(binary_path_for(xml_path))["params"]
+    except (OSError, ValueError):
+        return read_model(xml_path)[0]
+
+
+# ------------------------------
+# Enrollment journal
+# ------------------------------
+# Enrollments and removals since the model file was last written are appended to a journal
+# next to it, named for the model version like the binary twin, so a retrained model
+# starts without one. Each record is (label, rows, bins) followed by the rows as float32;
+# zero rows removes the label, otherwise the rows replace it.
+JOURNAL_MAGIC = b"LBPHJRN1"
+JOURNAL_RECORD = struct.Struct("<iII")
+COMPACT_FRACTION = 0.25  # compact() rewrites the model once the journal is this large relative to it
+
+def journal_path_for(xml_path):
+    """Journal of the model file's current version: <name>.<mtime_ns>-<size>.journal in hex"""
+    return binary_path_for(xml_path)[:-len(".lbph")] + ".journal"
+
+def _journal_records(f):
+    """(label, rows, bins, data offset) of each complete record; stops at a torn last one"""
+    size = os.fstat(f.fileno()).st_size
+    if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+        return
+    offset = len(JOURNAL_MAGIC)
+    while offset + JOURNAL_RECORD.size <= size:
+        f.seek(offset)
+        label, rows, bins = JOURNAL_RECORD.unpack(f.read(JOURNAL_RECORD.size))
+        data_offset = offset + JOURNAL_RECORD.size
+        offset = data_offset + rows * bins * 4
+        if offset > size:
+            return
+        yield label, rows, bins, data_offset
+
+def read_journal(path, histograms=True):
+    """The journal's changes in order, as (label, rows) with rows None for a removal.
+
+    With histograms=False only the row counts are read, as (label, count).
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return []
+    changes = []
+    with f:
+        for label, rows, bins, data_offset in list(_journal_records(f)):
+            if not histograms:
+                changes.append((label, rows))
+            elif rows:
+                f.seek(data_offset)
+                changes.append((label, np.fromfile(f, np.float32, rows * bins).reshape(rows, bins)))
+            else:
+                changes.append((label, None))
+    return changes
+
+def append_journal(path, label, histograms):
+    """Append one change: `histograms` replace the label's samples, None removes it"""
+    rows = np.zeros((0, 0), np.float32) if histograms is None else np.ascontiguousarray(histograms, np.float32)
+    with open(path, "a+b") as f:
+        f.seek(0)
+        if f.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+            f.truncate(0)
+            f.write(JOURNAL_MAGIC)
+        else:
+            f.seek(0)
+            end = len(JOURNAL_MAGIC)
+            for _, count, bins, data_offset in _journal_records(f):
+                end = data_offset + count * bins * 4
+            if end != os.fstat(f.fileno()).st_size:
+                f.truncate(end)  # A torn record from an interrupted append
+        f.write(JOURNAL_RECORD.pack(int(label), rows.shape[0], rows.shape[1] if rows.size else 0) + rows.tobytes())
+
+def apply_journal(histograms, labels, changes):
+    """(histograms, labels) with the journal's changes applied; changed users move to the end"""
+    latest = {}
+    for label, rows in changes:
+        latest.pop(label, None)
+        latest[label] = rows
+    if not latest:
+        return histograms, labels
+    keep = ~np.isin(labels, list(latest))
+    added = [(label, rows) for label, rows in latest.items() if rows is not None]
+    parts = ([histograms[keep]] if keep.any() else []) + [rows for _, rows in added]
+    histograms = np.vstack(parts) if parts else np.zeros((0, 0), np.float32)
+    labels = np.concatenate([labels[keep]] + [np.full(len(rows), label, np.int32) for label, rows in added])
+    return histograms, labels.astype(np.int32)
+
+def read_current_model(xml_path, changes=None):
+    """(params, histograms, labels) of the model with its journal applied.
+
+    The base comes from the binary twin when there is one, which is much faster than
+    parsing the XML.
+    """
+    try:
+        params, histograms, labels = read_binary_histograms(binary_path_for(xml_path))
+    except (OSError, ValueError):
+        params, histograms, labels = read_model(xml_path)
+    if changes is None:
+        changes = read_journal(journal_path_for(xml_path))
+    return (params, *apply_journal(histograms, labels, changes))
+
+def current_labels(xml_path):
+    """Labels of the model's samples (in no particular order) with its journal applied,
+    without reading any histograms"""
+    try:
+        labels = np.array(read_binary_model(binary_path_for(xml_path))[1]["labels"], np.int32)
+    except (OSError, ValueError):
+        labels = read_model(xml_path)[2]
+    for label, count in read_journal(journal_path_for(xml_path), histograms=False):
+        labels = np.concatenate([labels[labels != label], np.full(count, label, np.int32)])
+    return labels
@@ -0,0 +1,361 @@
+import os
+import time
+import threading
+import numpy as np
+
+import lbph_model
+
+
+# ------------------------------
+# LBP histograms (same maths as cv2.face.LBPHFaceRecognizer)
+# ------------------------------
+def lbp_image(face, radius=1, neighbors=8):
+    """Extended (circular) LBP codes, bit-for-bit the same as OpenCV's elbp().
+
+    Also takes an (n, rows, cols) stack of equal-size faces and codes them all at once.
+    """
+    src = np.asarray(face, np.float32)
+    rows, cols = src.shape[-2:]
+    center = src[..., radius:rows - radius, radius:cols - radius]
+    codes = np.zeros(center.shape, np.int32)
+    eps = np.finfo(np.float32).eps
+
+    for n in range(neighbors):
+        x = np.float32(radius * np.cos(2.0 * np.pi * n / float(neighbors)))
+        y = np.float32(-radius * np.sin(2.0 * np.pi * n / float(neighbors)))
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        ty, tx = np.float32(y - fy), np.float32(x - fx)
+        w1 = np.float32((1 - tx) * (1 - ty))
+        w2 = np.float32(tx * (1 - ty))
+        w3 = np.float32((1 - tx) * ty)
+        w4 = np.float32(tx * ty)
+
+        def shifted(dy, dx):
+            return src[..., radius + dy:rows - radius + dy, radius + dx:cols - radius + dx]
+
+        t = w1 * shifted(fy, fx) + w2 * shifted(fy, cx) + w3 * shifted(cy, fx) + w4 * shifted(cy, cx)
+        codes += ((t > center) | (np.abs(t - center) < eps)).astype(np.int32) << n
+    return codes
+
+def lbp_histogram(face, params=lbph_model.DEFAULT_PARAMS):
+    """Spatial LBP histogram of one face, laid out like LBPHFaceRecognizer.getHistograms()"""
+    return lbp_histograms(np.asarray(face)[None], params)[0]
+
+def lbp_histograms(faces, params=lbph_model.DEFAULT_PARAMS):
+    """lbp_histogram() of an (n, rows, cols) stack of equal-size faces, as an (n, bins) matrix"""
+    codes = lbp_image(faces, params["radius"], params["neighbors"])
+    grid_x, grid_y = params["grid_x"], params["grid_y"]
+    patterns = 2 ** params["neighbors"]
+    count = codes.shape[0]
+    height, width = codes.shape[1] // grid_y, codes.shape[2] // grid_x
+    bins = grid_x * grid_y * patterns
+
+    # One bincount over ((face * cells + cell) * patterns + code) builds every cell histogram at once
+    cells = codes[:, :grid_y * height, :grid_x * width].reshape(count, grid_y, height, grid_x, width)
+    cell_index = (np.arange(count)[:, None, None, None, None] * (grid_x * grid_y)
+                  + np.arange(grid_y)[None, :, None, None, None] * grid_x
+                  + np.arange(grid_x)[None, None, None, :, None])
+    flat = (cell_index * patterns + cells).ravel()
+    hist = np.bincount(flat, minlength=count * bins).astype(np.float32).reshape(count, bins)
+    # cv2 scales by the reciprocal rather than dividing, which matters in the last bit
+    return hist * np.float32(1.0 / (height * width)) if height and width else hist
+
+LBP_BLOCK = 8  # Faces coded per pass; bigger stacks fall out of the CPU cache and get slower
+
+def face_histograms(faces, params=lbph_model.DEFAULT_PARAMS, block=LBP_BLOCK):
+    """(n, bins) histograms of a list of faces, coded a block at a time when they share one size
+    (as normalized faces do)"""
+    if not len(faces):
+        return np.zeros((0, 0), np.float32)
+    if len({np.shape(face) for face in faces}) > 1:
+        return np.vstack([lbp_histogram(face, params) for face in faces])
+    return np.vstack([lbp_histograms(np.stack(faces[i:i + block]), params)
+                      for i in range(0, len(faces), block)])
+
+
+# ------------------------------
+# Vectorized matcher
+# ------------------------------
+PRUNE_MIN_USERS = 500  # Smaller rosters are searched exactly; pruning only pays off above this
+TIGHTEN_FRACTION = 0.1  # Share of a query's bins compared exactly to narrow down the samples left to check
+
+class LBPHMatcher:
+    """Nearest-neighbour LBPH prediction over all training histograms as one matrix.
+
+    Uses chi-square (the CHISQR_ALT form cv2 uses) rewritten for non-negative histograms:
+        sum((h - q)^2 / (h + q)) = sum(h) + sum(q) - 4 * sum(h*q / (h + q))
+    and since h*q / (h + q) <= sqrt(h*q) / 2, every distance is at least
+        sum(h) + sum(q) - 2 * sum(sqrt(h) * sqrt(q))
+    which is one BLAS matrix product against the stored square-rooted histograms for a
+    whole batch of queries. The `rerank` samples with the lowest bounds get the exact
+    distance first, then every other sample whose bound is below the best distance found,
+    so results match LBPHFaceRecognizer.predict() (up to cv2's order of summation on
+    near-ties).
+
+    Two options trade that guarantee for speed. With exact=False only the `rerank`
+    samples are compared; the true nearest sample ranks well inside that on face
+    histograms, but nothing guarantees it, and on large rosters it is several times
+    faster. With `candidates` on rosters of at least `prune_min_users` users, the product
+    is taken against per-user means of the square-rooted histograms instead (each user's
+    average bound), and only the samples of the `candidates` closest users are searched.
+    """
+
+    def __init__(self, histograms, labels, params=lbph_model.DEFAULT_PARAMS, **options):
+        self._attach(lbph_model.prepare_arrays(histograms, labels), params, **options)
+
+    def _attach(self, arrays, params, candidates=None, prune_min_users=PRUNE_MIN_USERS, rerank=32, exact=True):
+        # Samples are grouped by user so each user's rows form one contiguous span
+        self.params = dict(params)
+        self.hist = arrays["hist"]
+        self.sqrt_hist = np.asarray(arrays["sqrt_hist"], np.float32)  # No copy unless stored as float16
+        self.labels = np.asarray(arrays["labels"])
+        self.order = np.asarray(arrays["order"])
+        self.row_sums = np.asarray(arrays["row_sums"])
+        self.sqrt_centroids = arrays["sqrt_centroids"]
+        self.threshold = float(self.params["threshold"])
+        self.candidates = candidates
+        self.prune_min_users = prune_min_users
+        self.rerank = rerank
+        self.exact = exact
+
+        self.user_labels, starts, counts = np.unique(self.labels, return_index=True, return_counts=True)
+        self.user_spans = list(zip(starts, starts + counts))
+        self.pruning = bool(candidates) and len(self.user_labels) >= max(prune_min_users, candidates + 1)
+
+    @classmethod
+    def from_model_file(cls, path, **options):
+        params, histograms, labels = lbph_model.read_model(path)
+        return cls(histograms, labels, params, **options)
+
+    @classmethod
+    def from_binary(cls, path, **options):
+        """Memory-map a binary model: opening is near-instant and pages are shared between processes"""
+        params, arrays = lbph_model.read_binary_model(path)
+        matcher = cls.__new__(cls)
+        matcher._attach(arrays, params, **options)
+        return matcher
+
+    def _bounds(self, queries):
+        """Lower bounds of the distances from every query to every sample (queries x samples)"""
+        affinity = (np.sqrt(queries) @ self.sqrt_hist.T).astype(np.float64)
+        # float32 rounding can overstate a dot product of n terms by about n * eps of it
+        slack = 8.0 * np.finfo(np.float32).eps * (np.count_nonzero(queries, axis=1)[:, None] + 2) * affinity
+        q_sums = queries.sum(axis=1, dtype=np.float64)
+        return 2.0 * (self.row_sums[None, :] + q_sums[:, None] - 2.0 * affinity) - 4.0 * slack
+
+    def _gather(self, rows, cols):
+        """hist[rows][:, cols] as float64; one flat take() is about twice as fast as 2-D fancy indexing"""
+        flat = rows[:, None].astype(np.int64) * self.hist.shape[1] + cols
+        return np.take(self.hist.reshape(-1), flat).astype(np.float64)
+
+    def _exact(self, query, rows):
+        """Chi-square distances from one query to the given sample rows, in float64 like cv2"""
+        cols = np.flatnonzero(query)
+        h = self._gather(rows, cols)
+        q = query[cols].astype(np.float64)
+        return 2.0 * (self.row_sums[rows] + q.sum() - 4.0 * (h * q / (h + q)).sum(axis=1))
+
+    def _tighten(self, query, rows, bounds):
+        """Bounds for the given rows raised by taking the query's heaviest bins exactly:
+        there h*q/(h+q) replaces its sqrt(h*q)/2 estimate"""
+        cols = np.flatnonzero(query)
+        count = max(1, int(len(cols) * TIGHTEN_FRACTION))
+        heavy = cols[np.argpartition(-query[cols], count - 1)[:count]]
+        h = self._gather(rows, heavy)
+        q = query[heavy].astype(np.float64)
+        return bounds + 4.0 * (np.sqrt(h) * np.sqrt(q)).sum(axis=1) - 8.0 * (h * q / (h + q)).sum(axis=1)
+
+    def _nearest(self, query, rows, bounds=None):
+        """(label, distance) of the nearest of `rows`; with bounds, only the most promising
+        are compared exactly"""
+        if bounds is not None and len(rows) > self.rerank:
+            top = np.argpartition(bounds, self.rerank)[:self.rerank]
+            dist = self._exact(query, rows[top])
+            if self.exact:
+                # Any other sample whose bound beats the best distance could still win
+                rest = np.ones(len(rows), bool)
+                rest[top] = False
+                best = dist.min()
+                more = np.flatnonzero(rest & (bounds <= best))
+                if len(more) > self.rerank:
+                    # The margin absorbs float64 rounding, so a tie with the best is never dropped
+                    more = more[self._tighten(query, rows[more], bounds[more]) <= best * (1.0 + 1e-9)]
+                top, dist = np.concatenate([top, more]), np.concatenate([dist, self._exact(query, rows[more])])
+            rows = rows[top]
+        else:
+            dist = self._exact(query, rows)
+        # On exact ties cv2 keeps the earliest training sample
+        tied = np.flatnonzero(dist == dist.min())
+        best = tied[np.argmin(self.order[rows[tied]])]
+        return self._result(self.labels[rows[best]], dist[best])
+
+    def _candidate_rows(self, queries):
+        """For each query, the sample rows of the `candidates` users with the highest average affinity"""
+        affinity = np.sqrt(queries) @ self.sqrt_centroids.T
+        nearest = np.argpartition(-affinity, self.candidates - 1, axis=1)[:, :self.candidates]
+        return [np.concatenate([np.arange(*self.user_spans[u]) for u in users]) for users in nearest]
+
+    def query_histograms(self, faces):
+        return face_histograms(faces, self.params)
+
+    def predict_histograms(self, queries):
+        """(label, distance) for each query histogram; label -1 when over the threshold"""
+        queries = np.atleast_2d(np.asarray(queries, np.float32))
+        if not len(self.labels):
+            return [(-1, float(np.finfo(np.float64).max))] * len(queries)
+
+        if self.pruning:
+            return [self._nearest(query, rows) for query, rows in zip(queries, self._candidate_rows(queries))]
+
+        rows = np.arange(len(self.labels))
+        bounds = self._bounds(queries)
+        return [self._nearest(query, rows, b) for query, b in zip(queries, bounds)]
+
+    def _result(self, label, dist):
+        if dist >= self.threshold:
+            return -1, float(np.finfo(np.float64).max)
+        return int(label), float(dist)
+
+    def predict_batch(self, faces):
+        """Predict several face crops in one vectorized pass"""
+        if not len(faces):
+            return []
+        return self.predict_histograms(self.query_histograms(faces))
+
+    def predict(self, face):
+        """Drop-in for LBPHFaceRecognizer.predict(): returns (label, confidence)"""
+        return self.predict_batch([face])[0]
+
+
+def load_matcher(model_path, **options):
+    """Load the model for `model_path` by memory-mapping the binary twin of its current version.
+
+    A missing twin is generated from the XML first, so the next load is fast; one in an
+    older binary format is regenerated once. While the model has a journal of enrollments,
+    the twin and the journal are combined in memory instead.
+    """
+    bin_path = lbph_model.binary_path_for(model_path)
+    changes = lbph_model.read_journal(lbph_model.journal_path_for(model_path))
+    for attempt in range(2):
+        if not os.path.exists(bin_path):
+            try:
+                lbph_model.export_binary(model_path, bin_path)
+            except OSError as e:
+                # Possibly another process published the same twin first
+                print(f"Could not write binary model: {e}")
+        if not os.path.exists(bin_path):
+            break
+        try:
+            if not changes:
+                return LBPHMatcher.from_binary(bin_path, **options)
+            params, histograms, labels = lbph_model.read_binary_histograms(bin_path)
+            return LBPHMatcher(*lbph_model.apply_journal(histograms, labels, changes), params, **options)
+        except Exception as e:
+            print(f"Ignoring unreadable binary model: {e}")
+        try:
+            os.remove(bin_path)
+        except OSError:
+            break
+
+    params, histograms, labels = lbph_model.read_model(model_path)
+    return LBPHMatcher(*lbph_model.apply_journal(histograms, labels, changes), params, **options)
+
+
+# ------------------------------
+# Warm, hot-reloading model holder
+# ------------------------------
+class ModelHolder:
+    """Loads the model once per process and swaps in a retrained one without stopping readers.
+
+    current() returns the active (matcher, users) pair. At most every `check_interval`
+    seconds it compares the model and users files' (mtime, size) and the size of the
+    model's journal; on a change the new model is loaded on a background thread while
+    the old one keeps serving, then the pair is replaced in a single assignment (double
+    buffering).
+    """
+
+    def __init__(self, model_path, users_loader, users_path=None, check_interval=1.0, **options):
+        self.model_path = model_path
+        self.users_loader = users_loader
+        self.users_path = users_path
+        self.check_interval = check_interval
+        self.options = options
+        self.lock = threading.Lock()
+        self.active = None
+        self.version = None
+        self.loading = False
+        self.last_check = 0.0
+        self.reloads = 0
+
+    def _file_version(self):
+        version = []
+        for path in (self.model_path, self.users_path):
+            if path:
+                st = os.stat(path)
+                version.append((st.st_mtime_ns, st.st_size))
+        # Enrollments append to the journal without touching the model file
+        journal = lbph_model.journal_path_for(self.model_path)
+        version.append(os.path.getsize(journal) if os.path.exists(journal) else 0)
+        return tuple(version)
+
+    def _load(self, version):
+        try:
+            pair = (load_matcher(self.model_path, **self.options), self.users_loader())
+        except Exception as e:
+            print(f"Model reload failed, keeping the current model: {e}")
+            pair = None
+        with self.lock:
+            if pair is not None:
+                if self.active is not None:
+                    self.reloads += 1
+                # Dropping the old pair unmaps its twin, so the cleanup below can delete it
+                self.active, self.version = pair, version
+            self.loading = False
+        if pair is not None:
+            try:
+                lbph_model.remove_stale_binaries(self.model_path, lbph_model.binary_path_for(self.model_path))
+            except OSError:
+                pass  # The model is being replaced again; the next reload cleans up
+
+    def current(self):
+        """The active (matcher, users); the first call loads synchronously"""
+        if self.active is None:
+            with self.lock:
+                self.loading = True
+            self._load(self._file_version())
+            if self.active is None:
+                raise RuntimeError(f"Could not load model {self.model_path}")
+            self.last_check = time.monotonic()
+            return self.active
+
+        now = time.monotonic()
+        if now - self.last_check >= self.check_interval:
+            self.last_check = now
+            self.check_for_update()
+        return self.active
+
+    def check_for_update(self):
+        try:
+            version = self._file_version()
+        except OSError:
+            return False  # Model is being replaced or was removed; keep serving the current one
+        with self.lock:
+            if version == self.version or self.loading:
+                return False
+            self.loading = True
+        threading.Thread(target=self._load, args=(version,), daemon=True).start()
+        return True
+
+
+_holders = {}
+_holders_lock = threading.Lock()
+
+def get_model_holder(model_path, users_loader, users_path=None, **options):
+    """Process-wide ModelHolder for a model file and matcher options, shared by every session"""
+    key = (model_path, tuple(sorted(options.items())))
+    with _holders_lock:
+        holder = _holders.get(key)
+        if holder is None:
+            holder = _holders[key] = ModelHolder(model_path, users_loader, users_path, **options)
+        return holder
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import bisect
+import cProfile
+import pstats
+import threading
+from collections import deque
+from contextlib import contextmanager
+import cv2
+
+
+# ------------------------------
+# Latency histograms
+# ------------------------------
+BUCKETS_MS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds), Prometheus style"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.sum += ms
+        self.max = max(self.max, ms)
+
+    def quantile(self, q):
+        """Estimate by interpolating inside the bucket that holds the q-th observation"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = BUCKETS_MS[i - 1] if i else 0.0
+                upper = BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.max
+
+    def summary(self):
+        return {"count": self.count, "mean_ms": round(self.sum / self.count, 3) if self.count else 0.0,
+                "p50_ms": round(self.quantile(0.5), 3), "p95_ms": round(self.quantile(0.95), 3),
+                "p99_ms": round(self.quantile(0.99), 3), "max_ms": round(self.max, 3),
+                "buckets": dict(zip([str(b) for b in BUCKETS_MS] + ["+Inf"], self.counts))}
+
+
+# ------------------------------
+# Stage timers
+# ------------------------------
+class _NullTimer:
+    """Shared do-nothing timer so disabled instrumentation costs one method call"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_TIMER = _NullTimer()
+
+
+class _StageTimer:
+    __slots__ = ("metrics", "stage", "start")
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# ------------------------------
+# Metrics registry
+# ------------------------------
+class Metrics:
+    """Per-stage latency histograms and frame rates for the capture/recognition loops.
+
+    Disabled (the default), time() returns a shared no-op timer and every other call
+    returns immediately. `dump_path` is rewritten every `dump_interval` seconds, as
+    Prometheus text when it ends in .prom/.txt and as JSON otherwise. With
+    `profile_path`, the threads that enter profiled() are profiled with cProfile and
+    their stats are merged into one file when the session closes. Python 3.12+ allows
+    only one active profiler per process, so there a second concurrent profiled()
+    block runs unprofiled.
+    """
+
+    def __init__(self, enabled=False, overlay=False, dump_path=None, dump_interval=10.0,
+                 profile_path=None, fps_window=2.0):
+        self.enabled = enabled or overlay or bool(dump_path)
+        self.overlay = overlay
+        self.dump_path = dump_path
+        self.dump_interval = dump_interval
+        self.profile_path = profile_path
+        self.fps_window = fps_window
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.ticks = {}
+        self.totals = {}
+        self.started = time.time()
+        self.last_dump = time.monotonic()
+        self.profiles = []
+
+    def time(self, stage):
+        return _StageTimer(self, stage) if self.enabled else NULL_TIMER
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.observe(seconds * 1000.0)
+
+    def tick(self, counter="frames"):
+        """Count one event (e.g. a displayed frame) for the rate and total of `counter`"""
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        with self.lock:
+            window = self.ticks.get(counter)
+            if window is None:
+                window = self.ticks[counter] = deque()
+            window.append(now)
+            while window and now - window[0] > self.fps_window:
+                window.popleft()
+            self.totals[counter] = self.totals.get(counter, 0) + 1
+
+    def fps(self, counter="frames"):
+        window = self.ticks.get(counter)
+        if not window or len(window) < 2 or window[-1] == window[0]:
+            return 0.0
+        return (len(window) - 1) / (window[-1] - window[0])
+
+    # ---- reporting ----
+    def snapshot(self):
+        with self.lock:
+            return {
+                "uptime_s": round(time.time() - self.started, 1),
+                "fps": {name: round(self.fps(name), 2) for name in self.ticks},
+                "totals": dict(self.totals),
+                "stages": {name: hist.summary() for name, hist in sorted(self.stages.items())},
+            }
+
+    def prometheus_text(self):
+        snap = self.snapshot()
+        lines = ["# TYPE face_stage_latency_ms histogram"]
+        for stage, s in snap["stages"].items():
+            cumulative = 0
+            for le, n in s["buckets"].items():
+                cumulative += n
+                lines.append(f'face_stage_latency_ms_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+            lines.append(f'face_stage_latency_ms_sum{{stage="{stage}"}} {round(s["mean_ms"] * s["count"], 3)}')
+            lines.append(f'face_stage_latency_ms_count{{stage="{stage}"}} {s["count"]}')
+        lines.append("# TYPE face_fps gauge")
+        lines += [f'face_fps{{counter="{name}"}} {value}' for name, value in snap["fps"].items()]
+        lines.append("# TYPE face_events_total counter")
+        lines += [f'face_events_total{{counter="{name}"}} {value}' for name, value in snap["totals"].items()]
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path=None):
+        path = path or self.dump_path
+        if not path:
+            return
+        if path.endswith((".prom", ".txt")):
+            text = self.prometheus_text()
+        else:
+            text = json.dumps(self.snapshot(), indent=2) + "\n"
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+    def maybe_dump(self):
+        if not self.dump_path:
+            return
+        now = time.monotonic()
+        if now - self.last_dump >= self.dump_interval:
+            self.last_dump = now
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"Could not write metrics: {e}")
+
+    def draw_overlay(self, frame, counter="frames", top=5):
+        """Draw FPS and the slowest stages' p50/p95 in the frame's top-right corner"""
+        if not self.overlay:
+            return
+        with self.lock:
+            slowest = sorted(self.stages.items(), key=lambda kv: -kv[1].quantile(0.5))[:top]
+            lines = [f"FPS {self.fps(counter):.1f}"]
+            lines += [f"{name} {h.quantile(0.5):.1f}/{h.quantile(0.95):.1f} ms" for name, h in slowest]
+        x = max(10, frame.shape[1] - 260)
+        for i, text in enumerate(lines):
+            cv2.putText(frame, text, (x, 25 + 20 * i), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 255), 1)
+
+    # ---- profiling ----
+    @contextmanager
+    def profiled(self):
+        """cProfile the calling thread while inside the block (when a profile path is set)"""
+        if not self.profile_path:
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another thread's profiler is already active
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self.lock:
+                self.profiles.append(profile)
+
+    def close(self):
+        """Final metrics dump, and the merged profile of every profiled thread"""
+        if self.dump_path:
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"Could not write metrics: {e}")
+        if self.profile_path and self.profiles:
+            stats = pstats.Stats(self.profiles[0])
+            for profile in self.profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(self.profile_path)
+            self.profiles = []
+            print(f"Profile written to {self.profile_path} (view with: python -m pstats {self.profile_path})")
+
+
+DISABLED = Metrics()
+
+def from_env(environ=None):
+    """Metrics configured by FACE_METRICS=1, FACE_METRICS_OVERLAY=1, FACE_METRICS_FILE=<path>,
+    FACE_METRICS_INTERVAL=<seconds> and FACE_PROFILE=<path>"""
+    env = os.environ if environ is None else environ
+    on = lambda name: env.get(name, "").strip().lower() in ("1", "true", "yes", "on")
+    try:
+        interval = float(env.get("FACE_METRICS_INTERVAL", 10))
+    except ValueError:
+        interval = 10.0
+    return Metrics(enabled=on("FACE_METRICS"), overlay=on("FACE_METRICS_OVERLAY"),
+                   dump_path=env.get("FACE_METRICS_FILE") or None, dump_interval=interval,
+                   profile_path=env.get("FACE_PROFILE") or None)
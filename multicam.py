@@ -0,0 +1,209 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import multiprocessing
+import cv2
+
+from engine import RecognitionEngine, FaceTracker, create_backend, default_detector, motion_gated, open_source
+from matcher import get_model_holder, load_matcher
+
+
+# ------------------------------
+# Per-source recognition worker (one process per camera)
+# ------------------------------
+STATS_INTERVAL = 5.0
+
+def _read_users(users_path):
+    with open(users_path, "r") as f:
+        return json.load(f)
+
+def _camera_worker(name, spec, detector_spec, model_path, users_path, events, stop, options):
+    """Recognize faces from one source and send confirmed identities to the parent.
+
+    The model is the memory-mapped binary twin of model_path, so every worker maps the
+    same file and the OS keeps one copy of it in RAM however many cameras run.
+    """
+    cv2.setNumThreads(1)  # One core per stream; the processes provide the parallelism
+    model = get_model_holder(model_path, lambda: _read_users(users_path), users_path,
+                             candidates=options.get("candidates"))
+    try:
+        detector = create_backend(*detector_spec)
+    except Exception as e:
+        events.put(("error", name, str(e)))
+        events.put(("done", name, 0, 0.0))
+        return
+    min_check_hz = options.get("motion_gate")
+    detector = default_detector(detector) if min_check_hz is None else motion_gated(detector, min_check_hz)
+    engine = RecognitionEngine(None, model=model, tracker=FaceTracker(), detector=detector)
+    window = f"Attendance - {name}"
+
+    try:
+        with open_source(spec) as source:
+            if not source.is_opened():
+                events.put(("error", name, f"cannot open source {spec}"))
+                return
+            last_stats = time.monotonic()
+            for frame, found in engine.run(source):
+                if stop.is_set():
+                    break
+                for event in found:
+                    if event.confirmed and event.name != "Unknown":
+                        events.put(("seen", name, event.user_id, event.name, event.confidence, event.timestamp))
+                if options.get("show"):
+                    for event in found:
+                        x, y, w, h = event.bbox
+                        cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0) if event.confirmed else (0, 255, 255), 2)
+                        cv2.putText(frame, event.name if event.confirmed else "Identifying...", (x, y - 10),
+                                    cv2.FONT_HERSHEY_DUPLEX, 0.7, (0, 255, 0), 2)
+                    cv2.imshow(window, frame)
+                    if cv2.waitKey(1) & 0xFF == ord("q"):
+                        stop.set()
+                        break
+                now = time.monotonic()
+                if now - last_stats >= STATS_INTERVAL:
+                    events.put(("stats", name, engine.frame_count, engine.fps()))
+                    last_stats = now
+                if options.get("max_frames") and engine.frame_count >= options["max_frames"]:
+                    break
+    except Exception as e:
+        events.put(("error", name, str(e)))
+    finally:
+        if options.get("show"):
+            cv2.destroyAllWindows()
+        events.put(("done", name, engine.frame_count, engine.fps()))
+
+
+# ------------------------------
+# Single attendance writer (parent process)
+# ------------------------------
+class AttendanceWriter:
+    """Records each user at most once per day, whichever stream saw them first.
+
+    Only this process writes attendance, so cameras never race on the database. With
+    record=False nothing is written, but each user is still reported once per session.
+    """
+
+    def __init__(self, record=True):
+        import common  # Parent only: workers never touch the attendance files
+        self.common = common
+        self.record = record
+        self.session = {}  # user_id -> source that saw them first
+
+    def handle(self, source, user_id, name, confidence, timestamp):
+        """Returns a JSON-ready record of what happened to the sighting"""
+        uid = str(user_id)
+        if uid in self.session or self.common.today_attendance.contains(uid):
+            status = "duplicate"
+        else:
+            status = "seen"
+            if self.record:
+                self.common.append_attendance(uid, name)
+                status = "recorded"
+            self.session[uid] = source
+        return {"source": source, "user_id": int(user_id), "name": name, "confidence": round(confidence, 2),
+                "timestamp": timestamp, "status": status}
+
+
+def source_names(sources):
+    """Short display names for the sources, made unique so two clips with the same file
+    name (or one source given twice) keep separate stats and event streams"""
+    names = [f"cam{i}" if str(spec).isdigit() else os.path.basename(str(spec)) or f"src{i}"
+             for i, spec in enumerate(sources)]
+    unique = []
+    for i, name in enumerate(names):
+        if names.count(name) > 1 or name in unique:
+            name = f"{i}:{name}"
+        unique.append(name)
+    return unique
+
+def run_multicam(sources, record=True, show=False, max_frames=0, candidates=None, out=sys.stdout):
+    """Run one worker process per source until they finish or stop; returns per-source stats"""
+    import common
+
+    detector_spec = common.detector_spec()
+    if detector_spec[1] is None or not os.path.exists(detector_spec[1]):
+        raise RuntimeError("Face detector not found")
+    if not os.path.exists(common.model_path):
+        raise RuntimeError("Model not trained yet")
+    # Make sure the binary model is current before the workers map it
+    load_matcher(common.model_path)
+
+    ctx = multiprocessing.get_context("spawn")
+    events, stop = ctx.Queue(), ctx.Event()
+    options = {"show": show, "max_frames": max_frames, "candidates": candidates,
+               "motion_gate": common.motion_min_check_hz if common.motion_gate else None}
+    names = source_names(sources)
+    workers = [ctx.Process(target=_camera_worker, daemon=True,
+                           args=(name, spec, detector_spec, common.model_path, common.users_json,
+                                 events, stop, options))
+               for name, spec in zip(names, sources)]
+    if len(workers) > (os.cpu_count() or 1):
+        print(f"{len(workers)} sources on {os.cpu_count()} CPUs: streams will share cores", file=sys.stderr)
+
+    writer = AttendanceWriter(record)
+    common.today_attendance.invalidate()
+    stats = {name: {"frames": 0, "fps": 0.0, "recorded": 0} for name in names}
+    for worker in workers:
+        worker.start()
+
+    running = len(workers)
+    try:
+        while running:
+            try:
+                message = events.get(timeout=0.5)
+            except queue.Empty:
+                if not any(w.is_alive() for w in workers):
+                    break
+                continue
+            kind, name = message[0], message[1]
+            if kind == "seen":
+                result = writer.handle(name, *message[2:])
+                if result["status"] != "duplicate":
+                    stats[name]["recorded"] += result["status"] == "recorded"
+                    print(json.dumps(result), file=out, flush=True)
+            elif kind in ("stats", "done"):
+                stats[name].update(frames=message[2], fps=round(message[3], 1))
+                running -= kind == "done"
+            elif kind == "error":
+                print(f"{name}: {message[2]}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+    return stats
+
+
+# ------------------------------
+# Command line
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Attendance from several cameras with one shared model")
+    parser.add_argument("--source", action="append", required=True,
+                        help="camera index, video file or image folder; repeat once per entrance")
+    parser.add_argument("--no-record", action="store_true", help="print sightings without writing attendance")
+    parser.add_argument("--show", action="store_true", help="open a preview window per source")
+    parser.add_argument("--max-frames", type=int, default=0, help="stop each source after N frames")
+    parser.add_argument("--prune", type=int, default=0,
+                        help="compare only the N closest users' samples on rosters of 500+ users (0 = off)")
+    args = parser.parse_args(argv)
+
+    try:
+        stats = run_multicam(args.source, record=not args.no_record, show=args.show,
+                             max_frames=args.max_frames, candidates=args.prune or None)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(json.dumps(stats), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
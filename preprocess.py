@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import math
+import shutil
+import argparse
+import cv2
+import numpy as np
+
+
+# ------------------------------
+# Canonical face normalization
+# ------------------------------
+FACE_SIZE = 100         # Side of every canonical crop; LBPH's 8x8 grid gives 12 px cells
+NORMALIZE_VERSION = 2   # Bump when the maths below (or which samples count as normalized) changes,
+                        # so caches built with the old one are dropped
+EQUALIZE_METHODS = ("clahe", "hist", "none")
+EYE_CASCADE = os.path.join("Resources", "haarcascade_eye.xml")
+
+
+class FaceNormalizer:
+    """Turns any face crop into the canonical FACE_SIZE square used by registration,
+    training and recognition: optional eye alignment, resize, then contrast equalization.
+
+    Every crop costs the same to histogram afterwards, and one person's histograms no
+    longer depend on their distance from the camera or the lighting.
+    """
+
+    def __init__(self, size=FACE_SIZE, equalize="clahe", eye_cascade_path=None):
+        if equalize not in EQUALIZE_METHODS:
+            raise ValueError(f"unknown equalization {equalize!r} (choose from {', '.join(EQUALIZE_METHODS)})")
+        self.size = size
+        self.equalize = equalize
+        self.clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4)) if equalize == "clahe" else None
+        self.eyes = cv2.CascadeClassifier(eye_cascade_path) if eye_cascade_path else None
+        if self.eyes is not None and self.eyes.empty():
+            print(f"Could not load eye cascade {eye_cascade_path}; faces will not be aligned")
+            self.eyes = None
+
+    @property
+    def signature(self):
+        """Identifies the settings; stored with caches of normalized faces"""
+        return f"v{NORMALIZE_VERSION}:{self.size}:{self.equalize}:{'eyes' if self.eyes is not None else 'none'}"
+
+    def find_eyes(self, face):
+        """Centres of the two largest eyes in the upper half, as (left, right), or None"""
+        upper = face[:face.shape[0] // 2]
+        found = self.eyes.detectMultiScale(upper, 1.1, 3, minSize=(max(1, face.shape[1] // 10),) * 2)
+        if len(found) < 2:
+            return None
+        two = sorted(found, key=lambda e: e[2] * e[3], reverse=True)[:2]
+        left, right = sorted((x + w / 2.0, y + h / 2.0) for x, y, w, h in two)
+        if right[0] - left[0] < face.shape[1] * 0.2:
+            return None  # Both boxes on one eye
+        return left, right
+
+    def align(self, face):
+        """Rotate the crop so the eyes are level; unchanged when they cannot be found"""
+        eyes = self.find_eyes(face)
+        if eyes is None:
+            return face
+        (lx, ly), (rx, ry) = eyes
+        angle = math.degrees(math.atan2(ry - ly, rx - lx))
+        if abs(angle) < 1.0 or abs(angle) > 30.0:
+            return face  # Already level, or an implausible pair
+        centre = ((lx + rx) / 2.0, (ly + ry) / 2.0)
+        m = cv2.getRotationMatrix2D(centre, angle, 1.0)
+        return cv2.warpAffine(face, m, (face.shape[1], face.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+    def __call__(self, face):
+        if face.ndim == 3:
+            face = cv2.cvtColor(face, cv2.COLOR_BGR2GRAY)
+        if self.eyes is not None:
+            face = self.align(face)
+        if face.shape[:2] != (self.size, self.size):
+            shrinking = face.shape[0] > self.size
+            face = cv2.resize(face, (self.size, self.size),
+                              interpolation=cv2.INTER_AREA if shrinking else cv2.INTER_LINEAR)
+        if self.clahe is not None:
+            return self.clahe.apply(face)
+        if self.equalize == "hist":
+            return cv2.equalizeHist(face)
+        return np.ascontiguousarray(face)
+
+    def prepare(self, sample, normalized):
+        """A stored sample: ones recorded as normalized (see is_normalized) are used as they are"""
+        return sample if normalized else self(sample)
+
+
+_default = None
+
+def default_normalizer():
+    """Process-wide normalizer configured by FACE_EQUALIZE=clahe|hist|none and FACE_ALIGN=1.
+
+    Worker processes inherit the environment, so they build the same one.
+    """
+    global _default
+    if _default is None:
+        equalize = os.environ.get("FACE_EQUALIZE", "clahe").strip().lower()
+        align = os.environ.get("FACE_ALIGN", "").strip().lower() in ("1", "true", "yes", "on")
+        eye_path = None
+        if align:
+            base = getattr(sys, "_MEIPASS", os.path.abspath("."))
+            eye_path = os.path.join(base, EYE_CASCADE)
+            if not os.path.exists(eye_path):
+                print(f"FACE_ALIGN is set but {EYE_CASCADE} was not found; faces will not be aligned")
+                eye_path = None
+        _default = FaceNormalizer(equalize=equalize, eye_cascade_path=eye_path)
+    return _default
+
+
+# ------------------------------
+# Normalized sample manifest
+# ------------------------------
+NORMALIZED_MANIFEST = "normalized.json"  # Inside Data/: samples written by the normalizer, with their mtime and size
+
+def _manifest_path(data_folder):
+    return os.path.join(data_folder, NORMALIZED_MANIFEST)
+
+def load_normalized(data_folder):
+    """{filename: [mtime_ns, size]} of the samples recorded as written by the normalizer"""
+    try:
+        with open(_manifest_path(data_folder), encoding="utf-8") as f:
+            entries = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable {NORMALIZED_MANIFEST}: {e}")
+        return {}
+    return entries if isinstance(entries, dict) else {}
+
+def mark_normalized(data_folder, filenames):
+    """Record samples just written by the normalizer; entries for files that are gone are dropped"""
+    entries = load_normalized(data_folder)
+    for filename in filenames:
+        try:
+            st = os.stat(os.path.join(data_folder, filename))
+        except OSError:
+            continue
+        entries[filename] = [st.st_mtime_ns, st.st_size]
+    entries = {f: v for f, v in entries.items() if os.path.exists(os.path.join(data_folder, f))}
+    path = _manifest_path(data_folder)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entries, f)
+    os.replace(tmp_path, path)
+
+_manifests = {}  # data folder -> (manifest mtime_ns, entries), so each process reads it once
+
+def is_normalized(path, entries=None):
+    """True if the sample was recorded by mark_normalized and has not changed since.
+
+    Shape is not evidence: a crop saved before normalization may happen to be FACE_SIZE square.
+    """
+    folder, filename = os.path.split(path)
+    try:
+        if entries is None:
+            version = os.stat(_manifest_path(folder)).st_mtime_ns
+            cached = _manifests.get(folder)
+            if cached is None or cached[0] != version:
+                cached = _manifests[folder] = (version, load_normalized(folder))
+            entries = cached[1]
+        entry = entries.get(filename)
+        if entry is None:
+            return False
+        st = os.stat(path)
+    except OSError:
+        return False
+    return list(entry) == [st.st_mtime_ns, st.st_size]
+
+
+# ------------------------------
+# Data/ migration
+# ------------------------------
+ORIGINALS_FOLDER = "originals"  # Inside Data/: the untouched crops, so a migration can be redone
+
+def sample_files(data_folder):
+    return sorted(f for f in os.listdir(data_folder)
+                  if f.startswith("User.") and f.lower().endswith((".jpg", ".jpeg")))
+
+def migrate_samples(data_folder, normalizer=None, force=False, keep_originals=True):
+    """Rewrite every User.<id>.<n>.jpg in `data_folder` as a canonical sample.
+
+    Originals are copied to Data/originals/ first. Samples recorded as normalized are left
+    alone; with `force`, those that have an original are normalized again from it (after
+    changing FACE_EQUALIZE/FACE_ALIGN). Returns {"normalized", "skipped", "failed"}.
+    """
+    normalizer = normalizer or default_normalizer()
+    originals = os.path.join(data_folder, ORIGINALS_FOLDER)
+    marked = load_normalized(data_folder)
+    summary = {"normalized": 0, "skipped": 0, "failed": 0}
+    written = []
+
+    try:
+        for filename in sample_files(data_folder):
+            path = os.path.join(data_folder, filename)
+            original = os.path.join(originals, filename)
+            has_original = os.path.exists(original)
+            if is_normalized(path, marked) and not (force and has_original):
+                summary["skipped"] += 1  # Normalizing twice would distort it
+                continue
+            # An unrecorded sample with a backup is from an interrupted run: start again from the backup
+            face = cv2.imdecode(np.fromfile(original if has_original else path, np.uint8), cv2.IMREAD_GRAYSCALE)
+            if face is None:
+                print(f"Could not read {filename}")
+                summary["failed"] += 1
+                continue
+            if keep_originals and not has_original:
+                os.makedirs(originals, exist_ok=True)
+                shutil.copy2(path, original)
+            ok, encoded = cv2.imencode(".jpg", normalizer(face))
+            if not ok:
+                summary["failed"] += 1
+                continue
+            tmp_path = path + ".tmp"
+            encoded.tofile(tmp_path)
+            os.replace(tmp_path, path)
+            written.append(filename)
+            summary["normalized"] += 1
+    finally:
+        if written:
+            mark_normalized(data_folder, written)
+    return summary
+
+def mark_existing(data_folder, size=FACE_SIZE):
+    """Record the FACE_SIZE samples already in `data_folder` as normalized without touching them.
+
+    For samples registered before the manifest existed; crops saved before normalization
+    existed must not be marked this way. Returns the marked file names.
+    """
+    marked = []
+    for filename in sample_files(data_folder):
+        face = cv2.imdecode(np.fromfile(os.path.join(data_folder, filename), np.uint8), cv2.IMREAD_GRAYSCALE)
+        if face is not None and face.shape == (size, size):
+            marked.append(filename)
+    mark_normalized(data_folder, marked)
+    return marked
+
+def remove_originals(data_folder, user_id):
+    """Forget a user's backed-up crops, e.g. when they are deleted or registered again"""
+    originals = os.path.join(data_folder, ORIGINALS_FOLDER)
+    if not os.path.isdir(originals):
+        return 0
+    removed = 0
+    for filename in os.listdir(originals):
+        if filename.startswith(f"User.{user_id}."):
+            os.remove(os.path.join(originals, filename))
+            removed += 1
+    return removed
+
+
+# ------------------------------
+# Command line
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the face samples in Data/ to canonical normalized crops")
+    parser.add_argument("--force", action="store_true",
+                        help="normalize again from Data/originals/ (after changing FACE_EQUALIZE / FACE_ALIGN)")
+    parser.add_argument("--no-backup", action="store_true", help="do not keep the original crops")
+    parser.add_argument("--no-train", action="store_true", help="do not retrain the model afterwards")
+    parser.add_argument("--mark-existing", action="store_true",
+                        help="first record the 100x100 samples already in Data/ as normalized (only when all of "
+                             "them were registered by a version that normalized them)")
+    args = parser.parse_args(argv)
+
+    import common
+    import training
+    import lbph_model
+
+    normalizer = default_normalizer()
+    print(f"Normalization: {normalizer.signature}", file=sys.stderr)
+    if args.mark_existing:
+        marked = mark_existing(common.data_folder, normalizer.size)
+        cache = training.SampleCache(common.sample_cache_path)
+        cache.invalidate(marked)  # Decoded while unrecorded, so normalized a second time
+        cache.save()
+        print(f"{len(marked)} existing samples recorded as normalized", file=sys.stderr)
+    summary = migrate_samples(common.data_folder, normalizer, force=args.force, keep_originals=not args.no_backup)
+    print(f"{summary['normalized']} samples normalized, {summary['skipped']} already canonical, "
+          f"{summary['failed']} unreadable", file=sys.stderr)
+
+    # A model trained on the old crops no longer matches what recognition feeds it
+    if not args.no_train and os.path.exists(common.model_path):
+        image_files = [f for f in os.listdir(common.data_folder) if f.lower().endswith((".jpg", ".jpeg"))]
+        cache = training.SampleCache(common.sample_cache_path)
+        cache.prune(image_files)
+        samples, kept = training.train_files(common.data_folder, image_files, common.model_path, cache,
+                                             checkpoint=training.HistogramCheckpoint(common.train_checkpoint_path))
+        if samples:
+            try:
+                lbph_model.export_binary(common.model_path)
+            except Exception as e:
+                print(f"Could not write binary model: {e}", file=sys.stderr)
+        print(f"Model retrained: {samples} samples, {kept} kept", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+import os
+import queue
+import threading
+import cv2
+import numpy as np
+
+
+# ------------------------------
+# Background image writer
+# ------------------------------
+class ImageWriter:
+    """Encodes and writes images on a worker thread so capture loops never wait on disk.
+
+    Writes to the same path are applied in submission order, so a replaced sample
+    always ends up with the newest image.
+    """
+
+    def __init__(self, max_pending=64):
+        self.queue = queue.Queue(max_pending)
+        self.written = 0
+        self.paths = set()  # Paths written successfully at least once
+        self.errors = []
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, image = item
+            try:
+                if not cv2.imwrite(path, image):
+                    raise OSError("encoder returned False")
+                self.written += 1
+                self.paths.add(path)
+            except Exception as e:
+                self.errors.append(f"{os.path.basename(path)}: {e}")
+
+    def write(self, path, image):
+        self.queue.put((path, image))
+
+    def close(self):
+        """Wait for pending writes; returns the number written"""
+        self.queue.put(None)
+        self.thread.join()
+        return self.written
+
+
+# ------------------------------
+# Sample quality
+# ------------------------------
+QUALITY_SIZE = 96  # Crops are scored at a fixed size so scores do not depend on distance
+
+def sharpness(face):
+    """Variance of the Laplacian; low values mean motion blur or bad focus"""
+    face = cv2.resize(face, (QUALITY_SIZE, QUALITY_SIZE), interpolation=cv2.INTER_AREA)
+    return float(cv2.Laplacian(face, cv2.CV_64F).var())
+
+def appearance(face, size=12):
+    """Zero-mean, unit-norm thumbnail; the dot product of two is their correlation.
+
+    Head pose, expression and lighting all move it, so distance between thumbnails
+    stands in for pose diversity without needing landmarks.
+    """
+    thumb = cv2.resize(cv2.equalizeHist(face), (size, size), interpolation=cv2.INTER_AREA)
+    vec = thumb.astype(np.float32).ravel()
+    vec -= vec.mean()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+class SampleSelector:
+    """Keeps up to `target` sharp, mutually different face samples.
+
+    A candidate is rejected as blurry if it is below `min_sharpness` or well below the
+    kept samples' median. If it correlates above `duplicate_threshold` with a kept sample
+    it replaces that sample only when clearly sharper, otherwise it is a duplicate.
+    """
+
+    def __init__(self, target=30, min_sharpness=15.0, duplicate_threshold=0.9,
+                 relative_sharpness=0.5, replace_margin=1.2):
+        self.target = target
+        self.min_sharpness = min_sharpness
+        self.duplicate_threshold = duplicate_threshold
+        self.relative_sharpness = relative_sharpness
+        self.replace_margin = replace_margin
+        self.vectors = []
+        self.scores = []
+        self.rejected = {"blurry": 0, "duplicate": 0}
+
+    def full(self):
+        return len(self.vectors) >= self.target
+
+    def offer(self, face):
+        """Returns (status, slot): "added"/"replaced" with the sample's slot, or a rejection"""
+        score = sharpness(face)
+        floor = self.min_sharpness
+        if len(self.scores) >= 5:
+            floor = max(floor, self.relative_sharpness * float(np.median(self.scores)))
+        if score < floor:
+            self.rejected["blurry"] += 1
+            return "blurry", None
+
+        vec = appearance(face)
+        if self.vectors:
+            similarity = np.dot(np.vstack(self.vectors), vec)
+            nearest = int(np.argmax(similarity))
+            if similarity[nearest] >= self.duplicate_threshold:
+                if score > self.scores[nearest] * self.replace_margin:
+                    self.vectors[nearest], self.scores[nearest] = vec, score
+                    return "replaced", nearest
+                self.rejected["duplicate"] += 1
+                return "duplicate", None
+
+        if self.full():
+            return "full", None
+        self.vectors.append(vec)
+        self.scores.append(score)
+        return "added", len(self.vectors) - 1
+
+
+def largest_face(faces):
+    """The biggest detection, i.e. the person standing at the camera"""
+    if len(faces) == 0:
+        return None
+    return max(faces, key=lambda f: f[2] * f[3])
@@ -0,0 +1,456 @@
+import os
+import sys
+import json
+import time
+import pickle
+import argparse
+import cv2
+import numpy as np
+from PIL import Image as PILImage
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import lbph_model
+from preprocess import default_normalizer, is_normalized
+
+
+# ------------------------------
+# Per-file sample extraction
+# ------------------------------
+def sample_label(filename):
+    """Return the integer user ID from User.<id>.<n>.jpg, or None"""
+    try:
+        return int(os.path.basename(filename).split(".")[1])
+    except (IndexError, ValueError):
+        return None
+
+def sample_index(filename):
+    """Return the sample number <n> from User.<id>.<n>.jpg, or None"""
+    try:
+        return int(os.path.basename(filename).split(".")[2])
+    except (IndexError, ValueError):
+        return None
+
+def read_face_sample(path):
+    """Decode one sample image as a canonical grayscale face, or None if unreadable.
+
+    Samples are already face crops, so no detection is run; ones not recorded as written
+    by the normalizer (e.g. saved before normalization existed) are normalized here.
+    """
+    try:
+        img_pil = PILImage.open(path).convert("L")
+    except Exception as e:
+        print(f"Could not open {os.path.basename(path)}: {e}")
+        return None
+    return default_normalizer().prepare(np.array(img_pil, "uint8"), is_normalized(path))
+
+def compute_histograms(faces):
+    """LBP histograms for the given crops, using the same parameters as the saved model.
+
+    Bit-for-bit what LBPHFaceRecognizer.train() computes, but equal-size (normalized)
+    faces are coded in vectorized blocks.
+    """
+    from matcher import face_histograms
+    return face_histograms(faces)
+
+
+# ------------------------------
+# Preprocessed sample cache
+# ------------------------------
+class SampleCache:
+    """Normalized face arrays keyed by sample file name, valid while the file's mtime and
+    size match. The whole cache is dropped when the normalization settings change."""
+
+    def __init__(self, path, signature=None):
+        self.path = path
+        self.signature = signature or default_normalizer().signature
+        self.entries = {}  # filename -> (mtime_ns, size, array)
+        self.dirty = False
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                payload = pickle.load(f)
+        except Exception as e:
+            print(f"Ignoring unreadable sample cache: {e}")
+            return
+        # Caches from before normalization are a bare dict and never match
+        if isinstance(payload, dict) and payload.get("signature") == self.signature:
+            self.entries = payload["entries"]
+        else:
+            self.dirty = True  # Rewrite it in the current format on the next save
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"signature": self.signature, "entries": self.entries}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+    @staticmethod
+    def file_key(path):
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+
+    def get(self, filename, key):
+        entry = self.entries.get(filename)
+        if entry is not None and entry[:2] == key:
+            return entry[2]
+        return None
+
+    def put(self, filename, key, face):
+        self.entries[filename] = (key[0], key[1], face)
+        self.dirty = True
+
+    def invalidate(self, filenames):
+        for filename in filenames:
+            if self.entries.pop(filename, None) is not None:
+                self.dirty = True
+
+    def prune(self, filenames):
+        """Drop entries for files that no longer exist in the dataset"""
+        self.invalidate(set(self.entries) - set(filenames))
+
+
+def collect_samples(folder, image_files, cache=None, progress=None):
+    """Load face arrays and labels, decoding only files missing from the cache"""
+    faces, ids = [], []
+
+    for idx, filename in enumerate(image_files):
+        user_id = sample_label(filename)
+        if user_id is None:
+            continue
+
+        path = os.path.join(folder, filename)
+        key = SampleCache.file_key(path)
+        face = cache.get(filename, key) if cache else None
+        if face is None:
+            face = read_face_sample(path)
+            if face is None:
+                continue
+            if cache:
+                cache.put(filename, key, face)
+        faces.append(face)
+        ids.append(user_id)
+
+        if progress and idx % 10 == 0:
+            progress(idx + 1, len(image_files))
+
+    if cache:
+        cache.save()
+    return faces, ids
+
+
+# ------------------------------
+# Training checkpoint
+# ------------------------------
+class TrainingCancelled(Exception):
+    """Raised by extraction when its `cancelled()` callback returns True"""
+
+
+class HistogramCheckpoint:
+    """Histograms already computed by a training run, so an interrupted run can resume.
+
+    The file is an append-only log of pickled {filename: (mtime_ns, size, label, histogram)}
+    chunks, so saving after every chunk costs only that chunk. With path=None it is an
+    in-memory store used by runs that do not checkpoint. A checkpoint written under other
+    normalization settings is discarded.
+    """
+
+    SIGNATURE_KEY = "__signature__"
+
+    def __init__(self, path=None, signature=None):
+        self.path = path
+        self.signature = signature or default_normalizer().signature
+        self.entries = {}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        good_size = 0
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    self.entries.update(pickle.load(f))
+                except EOFError:
+                    break
+                except Exception:
+                    print("Ignoring the torn end of the training checkpoint")
+                    break
+                good_size = f.tell()
+        if self.entries.pop(self.SIGNATURE_KEY, None) != self.signature:
+            self.clear()
+            return
+        if good_size != os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(good_size)
+
+    def get(self, filename, key):
+        entry = self.entries.get(filename)
+        return entry if entry is not None and entry[:2] == key else None
+
+    def add(self, records):
+        """records: {filename: (key, label, histogram)}"""
+        chunk = {name: (key[0], key[1], label, hist) for name, (key, label, hist) in records.items()}
+        self.entries.update(chunk)
+        if self.path and chunk:
+            if not os.path.exists(self.path):
+                chunk = {self.SIGNATURE_KEY: self.signature, **chunk}
+            with open(self.path, "ab") as f:
+                pickle.dump(chunk, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def arrays(self, image_files):
+        """(histograms, labels) for the given files, in file order"""
+        entries = [self.entries[f] for f in image_files if f in self.entries]
+        if not entries:
+            return np.zeros((0, 0), np.float32), np.zeros(0, np.int32)
+        return (np.vstack([e[3].reshape(1, -1) for e in entries]),
+                np.array([e[2] for e in entries], np.int32))
+
+    def clear(self):
+        self.entries = {}
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _pending_items(folder, image_files, cache, checkpoint):
+    """(filename, path, key, label, cached face or None) for samples not yet in the checkpoint"""
+    items = []
+    for filename in image_files:
+        label = sample_label(filename)
+        if label is None:
+            continue
+        path = os.path.join(folder, filename)
+        key = SampleCache.file_key(path)
+        if checkpoint.get(filename, key) is None:
+            items.append((filename, path, key, label, cache.get(filename, key) if cache else None))
+    return items
+
+
+# ------------------------------
+# Process pool workers
+# ------------------------------
+def _init_worker():
+    cv2.setNumThreads(1)  # One OpenCV thread per process; the pool provides the parallelism
+
+def _extract_chunk(items):
+    """items: (path, label, cached face or None); returns histograms, the paths they belong to,
+    and newly decoded faces"""
+    faces, labels, paths, decoded = [], [], [], {}
+    for path, label, face in items:
+        if face is None:
+            face = read_face_sample(path)
+            if face is None:
+                continue
+            decoded[path] = face
+        faces.append(face)
+        labels.append(label)
+        paths.append(path)
+    return compute_histograms(faces), labels, paths, decoded
+
+
+# ------------------------------
+# Histogram extraction (serial / parallel, resumable)
+# ------------------------------
+PARALLEL_MIN_FILES = 200  # Below this, process start-up costs more than it saves
+
+def default_workers():
+    return os.cpu_count() or 1
+
+def extract_histograms(folder, image_files, cache=None, workers=None, chunk_size=64, progress=None,
+                       checkpoint=None, cancelled=None, min_parallel=PARALLEL_MIN_FILES):
+    """Decode and histogram samples, reusing cached face arrays; returns (histograms, labels) in file order.
+
+    Work is done in chunks, across a process pool when `workers` > 1 and at least
+    `min_parallel` samples are left. Each finished chunk goes into `checkpoint`, so samples it already holds are
+    skipped. `progress(done, total)` is called per chunk and `cancelled()` is polled
+    between chunks; when it returns True the cache is saved and TrainingCancelled raised.
+    """
+    checkpoint = checkpoint if checkpoint is not None else HistogramCheckpoint()
+    items = _pending_items(folder, image_files, cache, checkpoint)
+    total = sum(1 for f in image_files if sample_label(f) is not None)
+    done = total - len(items)
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    by_path = {item[1]: item for item in items}
+
+    def finish_chunk(result, count):
+        nonlocal done
+        hists, labels, paths, decoded = result
+        if cache:
+            for path, face in decoded.items():
+                filename, _, key, _, _ = by_path[path]
+                cache.put(filename, key, face)
+        checkpoint.add({by_path[p][0]: (by_path[p][2], label, hist)
+                        for p, label, hist in zip(paths, labels, hists)})
+        done += count
+        if progress:
+            progress(done, total)
+
+    workers = workers or default_workers()
+    try:
+        if workers > 1 and len(items) >= min_parallel:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+                futures = {pool.submit(_extract_chunk, [(p, l, f) for _, p, _, l, f in chunk]): len(chunk)
+                           for chunk in chunks}
+                for future in as_completed(futures):
+                    finish_chunk(future.result(), futures[future])
+                    if cancelled and cancelled():
+                        pool.shutdown(wait=True, cancel_futures=True)
+                        raise TrainingCancelled()
+        else:
+            for chunk in chunks:
+                if cancelled and cancelled():
+                    raise TrainingCancelled()
+                finish_chunk(_extract_chunk([(p, l, f) for _, p, _, l, f in chunk]), len(chunk))
+    finally:
+        if cache:
+            cache.save()
+    return checkpoint.arrays(image_files)
+
+def train_files(folder, image_files, model_path, cache=None, workers=None, progress=None,
+                per_user=None, checkpoint=None, cancelled=None, min_parallel=PARALLEL_MIN_FILES):
+    """Train the LBPH model from sample files; returns (processed, kept) sample counts.
+
+    The checkpoint is cleared once the model is written; a cancelled run leaves it in
+    place for the next call to resume from.
+    """
+    hists, labels = extract_histograms(folder, image_files, cache, workers, progress=progress,
+                                       checkpoint=checkpoint, cancelled=cancelled, min_parallel=min_parallel)
+    kept = write_pruned_model(model_path, hists, labels, per_user)
+    if checkpoint is not None:
+        checkpoint.clear()
+    return len(labels), kept
+
+
+
+# ------------------------------
+# Per-user sample budget
+# ------------------------------
+SAMPLES_PER_USER = 20  # Representatives kept per user; 0 keeps every sample
+
+def _sq_distances(points, centroids):
+    # |p - c|^2 expanded so no (points x centroids x bins) array is built
+    return np.maximum((points ** 2).sum(axis=1)[:, None] + (centroids ** 2).sum(axis=1)[None, :]
+                      - 2.0 * points @ centroids.T, 0.0)
+
+def _kmeans_representatives(points, k, iterations=10, seed=0):
+    """Indices of the points nearest to k k-means centroids (k-means++ seeding)"""
+    rng = np.random.default_rng(seed)
+    centroids = points[[rng.integers(len(points))]]
+    for _ in range(1, k):
+        d2 = _sq_distances(points, centroids).min(axis=1)
+        pick = rng.choice(len(points), p=d2 / d2.sum()) if d2.sum() else rng.integers(len(points))
+        centroids = np.vstack([centroids, points[pick]])
+
+    for _ in range(iterations):
+        assign = _sq_distances(points, centroids).argmin(axis=1)
+        for j in range(k):
+            members = points[assign == j]
+            if len(members):
+                centroids[j] = members.mean(axis=0)
+
+    d2 = _sq_distances(points, centroids)
+    chosen = []
+    for j in range(k):
+        # The closest sample not already picked stands in for each cluster
+        for i in np.argsort(d2[:, j]):
+            if i not in chosen:
+                chosen.append(i)
+                break
+    return chosen
+
+def select_representatives(histograms, labels, per_user=SAMPLES_PER_USER):
+    """Indices of the samples to keep: at most `per_user` per label, covering each user's variety.
+
+    Histograms are clustered under the Hellinger map (sqrt), whose Euclidean distance
+    tracks the chi-square distance LBPH predicts with.
+    """
+    labels = np.asarray(labels)
+    if not per_user:
+        return np.arange(len(labels))
+    keep = []
+    for label in np.unique(labels):
+        idx = np.flatnonzero(labels == label)
+        if len(idx) <= per_user:
+            keep.extend(idx)
+            continue
+        points = np.sqrt(np.asarray(histograms[idx], np.float64))
+        # Same pairwise distances in n dimensions instead of one per histogram bin
+        points -= points.mean(axis=0)
+        eigval, eigvec = np.linalg.eigh(points @ points.T)
+        points = eigvec * np.sqrt(np.maximum(eigval, 0.0))
+        keep.extend(idx[_kmeans_representatives(points, per_user, seed=int(label))])
+    return np.sort(np.array(keep, np.int64))
+
+def write_pruned_model(model_path, histograms, labels, per_user=None):
+    """Write the model from the per-user representatives; returns the number kept"""
+    if not len(labels):
+        return 0
+    keep = select_representatives(histograms, labels, SAMPLES_PER_USER if per_user is None else per_user)
+    lbph_model.write_model(model_path, lbph_model.DEFAULT_PARAMS, histograms[keep], np.asarray(labels)[keep])
+    return len(keep)
+
+def evaluate_pruning(histograms, labels, per_user=SAMPLES_PER_USER, holdout=0.2, seed=0):
+    """Compare a model of all samples with a pruned one on a per-user held-out split"""
+    from matcher import LBPHMatcher
+
+    labels = np.asarray(labels)
+    rng = np.random.default_rng(seed)
+    test = []
+    for label in np.unique(labels):
+        idx = rng.permutation(np.flatnonzero(labels == label))
+        if len(idx) >= 2:
+            test.extend(idx[:max(1, int(round(len(idx) * holdout)))])
+    test = np.sort(np.array(test, np.int64))
+    train = np.setdiff1d(np.arange(len(labels)), test)
+    if not len(test):
+        raise ValueError("Need at least two samples for some user to hold any out")
+
+    pruned = train[select_representatives(histograms[train], labels[train], per_user)]
+    report = {"users": int(len(np.unique(labels))), "per_user": per_user,
+              "held_out": int(len(test)), "bytes_per_sample": int(histograms.shape[1] * 4)}
+    for name, rows in (("full", train), ("pruned", pruned)):
+        matcher = LBPHMatcher(histograms[rows], labels[rows])
+        start = time.perf_counter()
+        predicted = np.array([p[0] for p in matcher.predict_histograms(histograms[test])])
+        elapsed = time.perf_counter() - start
+        report[name] = {"samples": int(len(rows)),
+                        "model_bytes": int(len(rows) * histograms.shape[1] * 4),
+                        "accuracy": round(float((predicted == labels[test]).mean()), 4),
+                        "predict_ms": round(elapsed * 1000 / len(test), 3)}
+    report["size_reduction"] = round(1 - report["pruned"]["samples"] / report["full"]["samples"], 4)
+    report["accuracy_change"] = round(report["pruned"]["accuracy"] - report["full"]["accuracy"], 4)
+    return report
+
+
+# ------------------------------
+# Command line: evaluate the sample budget on Data/
+# ------------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report model size and accuracy for a per-user sample budget")
+    parser.add_argument("--per-user", type=int, default=SAMPLES_PER_USER)
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of each user's samples held out")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    import common
+    image_files = [f for f in os.listdir(common.data_folder) if f.lower().endswith((".jpg", ".jpeg"))]
+    cache = SampleCache(common.sample_cache_path)
+    faces, ids = collect_samples(common.data_folder, image_files, cache)
+    if not faces:
+        print("No samples in Data/")
+        return 1
+    report = evaluate_pruning(compute_histograms(faces), ids, args.per_user, args.holdout, args.seed)
+    json.dump(report, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())